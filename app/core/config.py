@@ -8,6 +8,23 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = Field("INFO", description="Logging level")
     COHERE_MODEL: str = Field("embed-english-v3.0", description="Cohere model to use for embeddings")
     COHERE_INPUT_TYPE: str = Field("search_document", description="Cohere input type for embeddings")
+    COHERE_QUERY_INPUT_TYPE: str = Field("search_query", description="Cohere input type for embedding search query text")
+    SQLITE_CACHE_SIZE: int = Field(-65536, description="SQLite cache_size pragma per connection (negative values are KiB)")
+    SQLITE_MMAP_SIZE: int = Field(268435456, description="SQLite mmap_size pragma per connection in bytes")
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(5000, description="How long a connection waits on a locked database before failing")
+    SQLITE_CACHED_STATEMENTS: int = Field(256, description="Prepared statements cached per pooled connection")
+    VECTOR_SEGMENT_CAPACITY: int = Field(65536, description="Number of vectors per append-only vector store segment file")
+    VECTOR_COMPACTION_DEAD_RATIO: float = Field(0.3, description="Fraction of tombstoned vectors that triggers background compaction")
+    VECTOR_COMPACTION_MIN_DEAD: int = Field(1000, description="Minimum number of tombstoned vectors before compaction is considered")
+    HNSW_BUILD_WORKERS: int = Field(1, description="Worker processes used to build HNSW indexes when the build request does not set num_workers")
+    INDEX_FLUSH_INTERVAL_SECONDS: float = Field(5.0, description="How often indexes changed by chunk writes are saved back to disk")
+    INDEX_CACHE_MAX_BYTES: int = Field(1024 * 1024 * 1024, description="Memory budget for loaded indexes kept in the process-wide LRU cache")
+    RESULT_CACHE_MAX_ENTRIES: int = Field(1024, description="Search results kept in the process-wide LRU result cache; 0 disables the cache")
+    RESULT_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Approximate memory budget for cached search results")
+    EMBEDDING_BATCH_MAX_SIZE: int = Field(96, description="Most texts coalesced into one embed call (capped at Cohere's limit of 96)")
+    EMBEDDING_BATCH_WINDOW_MS: float = Field(5.0, description="How long an embedding request waits for others to share its embed call")
+    EMBEDDING_BATCH_MAX_CONCURRENCY: int = Field(4, description="Batched embed calls allowed in flight at once")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = Field(10000, description="Embeddings kept in memory in front of the persistent embedding cache")
     
     class Config:
         env_file = ".env"
@@ -1,15 +1,22 @@
 import numpy as np
+import os
 import pickle
 from abc import ABC, abstractmethod
 from typing import List, Optional, Tuple, Dict, Any
+from app.indexing.index_storage import write_index_file, read_index_file, get_legacy_index_path
 from app.core.logger import logger
 
 class BaseIndex(ABC):
     """Abstract base class for both indexing algorithms"""
+    # Cost of one distance computed by search(), relative to one row of a vectorized scan; used by the query planner
+    SEARCH_DISTANCE_COST = 1.0
+    
     def __init__(self):
         self.index = None
         self.vectors = None
         self.built = False
+        # Chunk id held at each index position, captured when the index is built
+        self.ids: Optional[List[str]] = None
     
     @abstractmethod
     def build_index(self, vectors: np.ndarray, parameters: Dict[str, Any] = {}) -> bool:
@@ -19,33 +26,89 @@ class BaseIndex(ABC):
         pass
     
     @abstractmethod
-    def search(self, query_vector: List[float], k: int = 5) -> Tuple[List[int], List[float]]:
+    def search(self, query_vector: List[float], k: int = 5,
+               search_params: Optional[Dict[str, Any]] = None) -> Tuple[List[int], List[float]]:
         """
         Search for the k nearest neighbors of the query vector.
+        search_params holds per-query overrides (e.g. ef_search, exact); indexes ignore ones they don't use.
+        search_params['allowed'], a bool array over index positions, restricts results to the allowed positions.
         """
         pass
     
+    def search_batch(self, query_vectors: List[List[float]], k: int = 5,
+                     search_params: Optional[Dict[str, Any]] = None) -> List[Tuple[List[int], List[float]]]:
+        """
+        Search for the k nearest neighbors of each query vector.
+        Indexes that can share work across queries override this.
+        """
+        return [self.search(query_vector, k, search_params) for query_vector in query_vectors]
+    
+    def search_subset(self, query_vectors: List[List[float]], positions: np.ndarray,
+                      k: int = 5) -> List[Tuple[List[int], List[float]]]:
+        """
+        Exact search of each query over only the given positions, with one distance matrix for the batch.
+        Cheaper than a filtered index search when a filter leaves few positions.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        queries = np.asarray(query_vectors, dtype=self.vectors.dtype)
+        distances = self.pairwise_distances(queries, self.vectors[positions], getattr(self, 'distance_metric', 'l2'))
+        indices, top_distances = self.top_k_rows(distances, k)
+        return [(positions[row].tolist(), row_distances.tolist()) for row, row_distances in zip(indices, top_distances)]
+    
+    def estimate_search_distances(self, k: int, search_params: Optional[Dict[str, Any]] = None,
+                                  selectivity: float = 1.0) -> int:
+        """
+        Expected distance computations of one search() call when a fraction selectivity of positions is allowed.
+        """
+        return len(self.vectors) if self.vectors is not None else 0
+    
+    @staticmethod
+    def get_allowed_mask(search_params: Optional[Dict[str, Any]], count: int) -> Optional[np.ndarray]:
+        """
+        The allow-list bitmap from search_params, checked against the number of indexed vectors.
+        """
+        allowed = (search_params or {}).get('allowed')
+        if allowed is None:
+            return None
+        allowed = np.asarray(allowed, dtype=bool)
+        if allowed.ndim != 1 or len(allowed) > count:
+            raise ValueError(f"Allow-list of shape {allowed.shape} doesn't fit an index of {count} vectors")
+        if len(allowed) < count:
+            # Vectors added after the allow-list was built weren't matched against the filter
+            allowed = np.concatenate([allowed, np.zeros(count - len(allowed), dtype=bool)])
+        return allowed
+    
+    def get_last_search_stats(self) -> Dict[str, int]:
+        """
+        Work counters for the most recent search made by the calling thread, if the index tracks them.
+        """
+        return {}
+    
+    def _get_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Scalar attributes and arrays that make up the persisted index.
+        Subclasses extend both dicts with their own state.
+        """
+        attributes = {'built': self.built}
+        arrays = {}
+        if self.vectors is not None:
+            arrays['vectors'] = np.asarray(self.vectors)
+        if self.ids is not None:
+            arrays['chunk_ids'] = np.array([chunk_id.encode('utf-8') for chunk_id in self.ids], dtype=np.bytes_)
+        return attributes, arrays
+    
+    def _set_state(self, attributes: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.built = attributes.get('built', False)
+        self.vectors = arrays.get('vectors')
+        # Indexes saved before chunk ids were stored map positions by chunk insertion order instead
+        chunk_ids = arrays.get('chunk_ids')
+        self.ids = np.char.decode(chunk_ids, 'utf-8').tolist() if chunk_ids is not None else None
+    
     def save_index(self, file_path: str) -> bool:
         try:
-            with open(file_path, 'wb') as f:
-                # Persist full index state
-                state = {
-                    'index': self.index,
-                    'vectors': self.vectors,
-                    'built': self.built
-                }
-                # If index implementation exposes extra attributes, include them
-                if hasattr(self, 'levels'):
-                    state['levels'] = getattr(self, 'levels')
-                if hasattr(self, 'entry_point'):
-                    state['entry_point'] = getattr(self, 'entry_point')
-                if hasattr(self, 'M'):
-                    state['M'] = getattr(self, 'M')
-                if hasattr(self, 'ef_construction'):
-                    state['ef_construction'] = getattr(self, 'ef_construction')
-                if hasattr(self, 'ef_search'):
-                    state['ef_search'] = getattr(self, 'ef_search')
-                pickle.dump(state, f)
+            attributes, arrays = self._get_state()
+            attributes['index_class'] = self.__class__.__name__
+            write_index_file(file_path, attributes, arrays)
             logger.info(f"Index saved to {file_path}")
             return True
         except Exception as e:
@@ -54,29 +117,48 @@ class BaseIndex(ABC):
     
     def load_index(self, file_path: str) -> bool:
         try:
-            with open(file_path, 'rb') as f:
-                data = pickle.load(f)
-                # Load common fields
-                self.index = data.get('index')
-                self.vectors = data.get('vectors')
-                self.built = data.get('built', False)
-                # Load optional implementation specific fields if present
-                if 'levels' in data:
-                    setattr(self, 'levels', data.get('levels'))
-                if 'entry_point' in data:
-                    setattr(self, 'entry_point', data.get('entry_point'))
-                if 'M' in data:
-                    setattr(self, 'M', data.get('M'))
-                if 'ef_construction' in data:
-                    setattr(self, 'ef_construction', data.get('ef_construction'))
-                if 'ef_search' in data:
-                    setattr(self, 'ef_search', data.get('ef_search'))
+            if not os.path.exists(file_path):
+                legacy_path = get_legacy_index_path(file_path)
+                if legacy_path == file_path or not os.path.exists(legacy_path):
+                    logger.error(f"Failed to load index: {file_path} does not exist")
+                    return False
+                self._migrate_legacy_index(legacy_path, file_path)
+            attributes, arrays = read_index_file(file_path)
+            index_class = attributes.get('index_class')
+            if index_class and index_class != self.__class__.__name__:
+                raise ValueError(f"{file_path} holds a {index_class}, not a {self.__class__.__name__}")
+            self._set_state(attributes, arrays)
             logger.info(f"Index loaded from {file_path}")
             return True
         except Exception as e:
             logger.error(f"Failed to load index: {str(e)}")
             return False
     
+    def _migrate_legacy_index(self, legacy_path: str, file_path: str):
+        """
+        One-time conversion of a pickled index into the binary format.
+        The pickle is left in place so a rollback can still read it.
+        """
+        logger.info(f"Migrating legacy index {legacy_path} to {file_path}")
+        with open(legacy_path, 'rb') as f:
+            data = pickle.load(f)
+        self._set_legacy_state(data)
+        if not self.save_index(file_path):
+            raise IOError(f"Could not write migrated index to {file_path}")
+    
+    def _set_legacy_state(self, data: Dict[str, Any]):
+        """
+        Restore state from a pickled index dict. Subclasses convert their own structures.
+        """
+        # Load common fields
+        self.index = data.get('index')
+        self.vectors = data.get('vectors')
+        self.built = data.get('built', False)
+        # Load optional implementation specific fields if present
+        for attribute in ('M', 'ef_construction', 'ef_search', 'distance_metric'):
+            if attribute in data:
+                setattr(self, attribute, data.get(attribute))
+    
     def get_index_info(self) -> Dict[str, Any]:
         return {
             'type': self.__class__.__name__,
@@ -85,6 +167,12 @@ class BaseIndex(ABC):
             'dimensions': self.vectors.shape[1] if self.vectors is not None else 0
         }
     
+    def estimate_memory_bytes(self) -> int:
+        """
+        Approximate resident size of the index, used for cache budgeting.
+        """
+        return int(self.vectors.nbytes) if isinstance(self.vectors, np.ndarray) else 0
+    
     @staticmethod
     def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
         dot_product = np.dot(vec1, vec2)
@@ -99,4 +187,79 @@ class BaseIndex(ABC):
     @staticmethod
     def l2_distance(vec1: np.ndarray, vec2: np.ndarray) -> float:
         return np.sqrt(np.sum((vec1 - vec2) ** 2))
-    
\ No newline at end of file
+    
+    @staticmethod
+    def inner_product(vec1: np.ndarray, vec2: np.ndarray) -> float:
+        return np.dot(vec1, vec2)
+    
+    @staticmethod
+    def squared_norms(vectors: np.ndarray) -> np.ndarray:
+        """
+        Row-wise squared L2 norms, computed without materializing vectors ** 2.
+        """
+        return np.einsum('ij,ij->i', vectors, vectors)
+    
+    @staticmethod
+    def pairwise_distances(queries: np.ndarray, vectors: np.ndarray, metric: str = 'l2',
+                           vector_sq_norms: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        (Q, N) distance matrix between every query row and every vector row from a single GEMM.
+        Smaller is always closer, so inner product and cosine are returned as negated/1 - similarity.
+        """
+        if vector_sq_norms is None:
+            vector_sq_norms = BaseIndex.squared_norms(vectors)
+        dots = queries @ vectors.T
+        if metric == 'inner_product':
+            return -dots
+        if metric == 'cosine':
+            denom = np.sqrt(BaseIndex.squared_norms(queries))[:, None] * np.sqrt(vector_sq_norms)[None, :]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                similarities = np.where(denom > 0, dots / denom, 0.0)
+            return 1.0 - similarities
+        # l2 / euclidean: ||v - q||^2 = ||v||^2 - 2 v.q + ||q||^2, clipped against rounding below zero
+        sq_dists = vector_sq_norms[None, :] - 2.0 * dots + BaseIndex.squared_norms(queries)[:, None]
+        return np.sqrt(np.maximum(sq_dists, 0.0))
+    
+    @staticmethod
+    def distances_to_query(query: np.ndarray, vectors: np.ndarray, metric: str = 'l2',
+                           vector_sq_norms: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Distances from a single query to every row of vectors.
+        """
+        return BaseIndex.pairwise_distances(query[None, :], vectors, metric, vector_sq_norms)[0]
+    
+    @staticmethod
+    def top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Indices and distances of the k smallest entries, sorted ascending.
+        Uses argpartition so selection is O(N) and only the k winners are sorted.
+        """
+        n = len(distances)
+        if k <= 0 or n == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=distances.dtype)
+        if k < n:
+            candidates = np.argpartition(distances, k - 1)[:k]
+        else:
+            candidates = np.arange(n)
+        order = np.argsort(distances[candidates], kind='stable')
+        indices = candidates[order]
+        return indices, distances[indices]
+    
+    @staticmethod
+    def top_k_rows(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row-wise top_k over a (Q, N) distance matrix.
+        """
+        n = distances.shape[1]
+        k = min(k, n)
+        if k <= 0:
+            empty = np.empty((distances.shape[0], 0))
+            return empty.astype(np.int64), empty
+        if k < n:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(n), distances.shape)
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind='stable')
+        indices = np.take_along_axis(candidates, order, axis=1)
+        return indices, np.take_along_axis(candidate_distances, order, axis=1)
@@ -1,5 +1,5 @@
 import numpy as np
-from typing import List, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any
 from app.indexing.base_index import BaseIndex
 from app.core.logger import logger
 
@@ -7,16 +7,25 @@ class FlatIndex(BaseIndex):
     """
     Brute force index that calculates distances to all vectors.
     """
+    SUPPORTED_METRICS = ('l2', 'euclidean', 'cosine', 'inner_product')
+    # Upper bound on query_count * vector_count per distance matrix in search_batch
+    MAX_BATCH_ELEMENTS = 1 << 24
+    
     def __init__(self):
         super().__init__()
         self.distance_metric = 'l2'
+        # Cached row norms so each query only costs one matrix-vector product
+        self._sq_norms = None
     
     def build_index(self, vectors: np.ndarray, parameters: Dict[str, Any] = {}) -> bool:
         try:
             logger.info(f"Building FlatIndex with {len(vectors)} vectors")
             if 'distance_metric' in parameters:
                 self.distance_metric = parameters['distance_metric']
-            self.vectors = vectors
+            if self.distance_metric not in self.SUPPORTED_METRICS:
+                raise ValueError(f"Unsupported distance metric: {self.distance_metric}")
+            self.vectors = np.asarray(vectors)
+            self._sq_norms = self.squared_norms(self.vectors)
             self.built = True
             logger.info("FlatIndex built successfully")
             return True
@@ -24,7 +33,25 @@ class FlatIndex(BaseIndex):
             logger.error(f"Failed to build FlatIndex: {str(e)}")
             return False
     
-    def search(self, query_vector: List[float], k: int = 5) -> Tuple[List[int], List[float]]:
+    def _get_sq_norms(self) -> np.ndarray:
+        # Loaded indexes only restore vectors, so norms are recomputed on first use
+        if self._sq_norms is None or len(self._sq_norms) != len(self.vectors):
+            self._sq_norms = self.squared_norms(self.vectors)
+        return self._sq_norms
+    
+    def _get_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        attributes, arrays = super()._get_state()
+        attributes['distance_metric'] = self.distance_metric
+        return attributes, arrays
+    
+    def _set_state(self, attributes: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        super()._set_state(attributes, arrays)
+        self.distance_metric = attributes.get('distance_metric', 'l2')
+        self._sq_norms = None
+    
+    def search(self, query_vector: List[float], k: int = 5,
+               search_params: Optional[Dict[str, Any]] = None) -> Tuple[List[int], List[float]]:
+        # Every search is exact, so the allow-list is the only search_params entry that applies
         if not self.built or self.vectors is None:
             logger.error("Index not built or no vectors available")
             return [], []
@@ -34,25 +61,44 @@ class FlatIndex(BaseIndex):
             return [], []
         
         # Convert query vector to numpy array
-        query = np.array(query_vector)
-        distances = []
-        for i, vector in enumerate(self.vectors):
-            if self.distance_metric == 'cosine':
-                # Convert cosine similarity to distance (1 - similarity)
-                similarity = self.cosine_similarity(query, vector)
-                distance = 1 - similarity
-            elif self.distance_metric == 'euclidean':
-                distance = self.euclidean_distance(query, vector)
-            else:
-                distance = self.l2_distance(query, vector)
-            distances.append((i, distance))
-        
-        distances.sort(key=lambda x: x[1])
-        top_k = distances[:k]
-        indices = [idx for idx, _ in top_k]
-        distances = [dist for _, dist in top_k]
+        query = np.asarray(query_vector, dtype=self.vectors.dtype)
+        distances = self.distances_to_query(query, self.vectors, self.distance_metric, self._get_sq_norms())
+        allowed = self.get_allowed_mask(search_params, len(self.vectors))
+        if allowed is not None:
+            # Masked before selection so a selective filter still yields k allowed matches
+            distances[~allowed] = np.inf
+            k = min(k, int(allowed.sum()))
+        indices, top_distances = self.top_k(distances, k)
         logger.debug(f"FlatIndex search completed with {k} results")
-        return indices, distances
+        return indices.tolist(), top_distances.tolist()
+    
+    def search_batch(self, query_vectors: List[List[float]], k: int = 5,
+                     search_params: Optional[Dict[str, Any]] = None) -> List[Tuple[List[int], List[float]]]:
+        if not self.built or self.vectors is None:
+            logger.error("Index not built or no vectors available")
+            return [([], []) for _ in query_vectors]
+        
+        queries = np.asarray(query_vectors, dtype=self.vectors.dtype)
+        if queries.ndim != 2 or queries.shape[1] != self.vectors.shape[1]:
+            logger.error(f"Query batch shape {queries.shape} doesn't match index dimension {self.vectors.shape[1]}")
+            return [([], []) for _ in query_vectors]
+        
+        allowed = self.get_allowed_mask(search_params, len(self.vectors))
+        if allowed is not None:
+            k = min(k, int(allowed.sum()))
+        
+        # One GEMM per block of queries, sized so the (Q, N) distance matrix stays bounded
+        block = max(1, self.MAX_BATCH_ELEMENTS // max(len(self.vectors), 1))
+        results = []
+        for start in range(0, len(queries), block):
+            distances = self.pairwise_distances(queries[start:start + block], self.vectors,
+                                                self.distance_metric, self._get_sq_norms())
+            if allowed is not None:
+                distances[:, ~allowed] = np.inf
+            indices, top_distances = self.top_k_rows(distances, k)
+            results.extend(zip(indices.tolist(), top_distances.tolist()))
+        logger.debug(f"FlatIndex batch search completed for {len(queries)} queries")
+        return results
     
     def get_index_info(self) -> Dict[str, Any]:
         info = super().get_index_info()
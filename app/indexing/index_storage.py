@@ -0,0 +1,86 @@
+import json
+import os
+import struct
+import numpy as np
+from typing import Any, Dict, Tuple
+from app.core.logger import logger
+
+# File layout (all integers little-endian):
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | JSON header | padding
+#   followed by each array's raw C-contiguous bytes, every array starting on an ALIGNMENT boundary.
+# The header records dtype, shape and absolute byte offset for every array, so loading is a single
+# mmap of the file plus zero-copy views; nothing is parsed or copied per element.
+INDEX_MAGIC = b"VAPIIDX\x00"
+INDEX_FORMAT_VERSION = 1
+INDEX_FILE_SUFFIX = ".idx"
+LEGACY_INDEX_SUFFIX = ".pkl"
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+def get_index_path(library_id: str, index_type: str, data_dir: str = "data") -> str:
+    return os.path.join(data_dir, f"index_{library_id}_{index_type}{INDEX_FILE_SUFFIX}")
+
+def get_legacy_index_path(file_path: str) -> str:
+    root, _ = os.path.splitext(file_path)
+    return root + LEGACY_INDEX_SUFFIX
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_index_file(file_path: str, attributes: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+    """
+    Atomically write attributes and arrays to file_path in the binary index format.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    
+    # Offsets depend on the header length, so lay the header out until it stops growing
+    layout: Dict[str, Dict[str, Any]] = {}
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, array in arrays.items():
+            offset = _align(offset)
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += array.nbytes
+        header = json.dumps({'attributes': attributes, 'arrays': layout}).encode("utf-8")
+        required_start = _align(_PREAMBLE.size + len(header))
+        if required_start <= data_start:
+            break
+        data_start = required_start
+    
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b"\x00" * (layout[name]['offset'] - f.tell()))
+            f.write(array.tobytes(order='C'))
+    os.replace(tmp_path, file_path)
+
+def read_index_file(file_path: str) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Open an index file and return its attributes plus read-only array views backed by one mmap.
+    """
+    with open(file_path, 'rb') as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Not an index file: {file_path}")
+        if version > INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format version {version} in {file_path}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    
+    arrays: Dict[str, np.ndarray] = {}
+    mapped = None
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if nbytes == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+            continue
+        if mapped is None:
+            mapped = np.memmap(file_path, dtype=np.uint8, mode='r')
+        start = spec['offset']
+        arrays[name] = mapped[start:start + nbytes].view(dtype).reshape(shape)
+    logger.debug(f"Mapped {len(arrays)} arrays from {file_path} (format v{version})")
+    return header['attributes'], arrays
@@ -0,0 +1,220 @@
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+from app.core.logger import logger
+
+RANGE_OPERATORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    '$gt': np.greater,
+    '$gte': np.greater_equal,
+    '$lt': np.less,
+    '$lte': np.less_equal
+}
+
+# Operators decided once per distinct value of a column; mirrors QueryService._matches_metadata_filter
+VALUE_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '$eq': lambda chunk_value, value: not (chunk_value != value),
+    '$ne': lambda chunk_value, value: not (chunk_value == value),
+    '$in': lambda chunk_value, value: chunk_value in value,
+    '$nin': lambda chunk_value, value: chunk_value not in value,
+    '$contains': lambda chunk_value, value: isinstance(chunk_value, str) and isinstance(value, str) and value in chunk_value
+}
+
+def metadata_to_dict(metadata: Any) -> Dict[str, Any]:
+    """
+    Plain dict view of chunk metadata, which may be a pydantic model, a dict or None.
+    """
+    if metadata is None:
+        return {}
+    if isinstance(metadata, dict):
+        return metadata
+    try:
+        if hasattr(metadata, 'model_dump'):
+            return metadata.model_dump()
+    except Exception:
+        pass
+    # Fall back to attempting to convert via __dict__
+    try:
+        return dict(getattr(metadata, '__dict__', {}) or {})
+    except Exception:
+        return {}
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float))
+
+class MetadataColumn:
+    """
+    One metadata key across all index positions, dictionary encoded: codes[i] indexes
+    values for position i, or is -1 where the chunk lacks the key. Numbers are mirrored
+    into a float64 array so range operators compare without touching Python objects.
+    """
+    def __init__(self, capacity: int):
+        self.codes = np.full(capacity, -1, dtype=np.int32)
+        self.numbers = np.full(capacity, np.nan)
+        self.is_number = np.zeros(capacity, dtype=bool)
+        self.values: List[Any] = []
+        self._codes_by_key: Dict[Any, int] = {}
+    
+    def grow(self, capacity: int):
+        count = len(self.codes)
+        self.codes = np.concatenate([self.codes, np.full(capacity - count, -1, dtype=np.int32)])
+        self.numbers = np.concatenate([self.numbers, np.full(capacity - count, np.nan)])
+        self.is_number = np.concatenate([self.is_number, np.zeros(capacity - count, dtype=bool)])
+    
+    def set(self, position: int, value: Any):
+        key = self._value_key(value)
+        code = self._codes_by_key.get(key)
+        if code is None:
+            code = len(self.values)
+            self._codes_by_key[key] = code
+            self.values.append(value)
+        self.codes[position] = code
+        self.is_number[position] = is_number(value)
+        self.numbers[position] = float(value) if self.is_number[position] else np.nan
+    
+    def clear(self, position: int):
+        self.codes[position] = -1
+        self.is_number[position] = False
+        self.numbers[position] = np.nan
+    
+    def match_values(self, predicate: Callable[[Any], bool]) -> np.ndarray:
+        """
+        Positions whose value satisfies predicate, evaluating it once per distinct value.
+        """
+        matches = np.zeros(len(self.values) + 1, dtype=bool)  # The extra slot is code -1, a missing key
+        for code, value in enumerate(self.values):
+            try:
+                matches[code] = predicate(value)
+            except TypeError:
+                matches[code] = False
+        return matches[self.codes]
+    
+    @staticmethod
+    def _value_key(value: Any) -> Any:
+        # Equal values share a code, as with Python ==; unhashable values are keyed by their repr
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return ('__unhashable__', type(value).__name__, repr(value))
+
+class MetadataTable:
+    """
+    Columnar copy of chunk metadata aligned to an index's positions, so a metadata filter
+    evaluates to a bool mask over every position with NumPy operations instead of a
+    per-chunk Python loop.
+    """
+    def __init__(self, ids: List[Optional[str]], metadata: List[Any]):
+        self.count = len(ids)
+        self.capacity = max(self.count, 1)
+        self.live = np.zeros(self.capacity, dtype=bool)
+        self.columns: Dict[str, MetadataColumn] = {}
+        self._positions: Dict[str, int] = {}
+        for position, (chunk_id, chunk_metadata) in enumerate(zip(ids, metadata)):
+            if chunk_id is not None:
+                self.set_row(position, chunk_id, chunk_metadata)
+    
+    def set_row(self, position: int, chunk_id: str, metadata: Any):
+        """
+        Store a chunk's metadata at position; an older position held by the same chunk is cleared.
+        """
+        if position >= self.capacity:
+            self._grow(max(position + 1, 2 * self.capacity))
+        self.count = max(self.count, position + 1)
+        previous = self._positions.get(chunk_id)
+        if previous is not None and previous != position:
+            self._clear_row(previous)
+        self._clear_row(position)
+        self._positions[chunk_id] = position
+        self.live[position] = True
+        for key, value in metadata_to_dict(metadata).items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = MetadataColumn(self.capacity)
+            column.set(position, value)
+    
+    def update(self, chunk_id: str, metadata: Any) -> bool:
+        position = self._positions.get(chunk_id)
+        if position is None:
+            return False
+        self.set_row(position, chunk_id, metadata)
+        return True
+    
+    def remove(self, chunk_id: str) -> bool:
+        position = self._positions.pop(chunk_id, None)
+        if position is None:
+            return False
+        self._clear_row(position)
+        return True
+    
+    def evaluate(self, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        """
+        Bool mask over positions 0..count-1 of the live chunks matching the filter.
+        """
+        mask = self.live[:self.count].copy()
+        for clause in self.compile(metadata_filter):
+            mask &= clause(self)[:self.count]
+            if not mask.any():
+                break
+        return mask
+    
+    @staticmethod
+    def compile(metadata_filter: Dict[str, Any]) -> List[Callable[["MetadataTable"], np.ndarray]]:
+        """
+        Translate a filter dict into per-key clauses, each producing a mask over a table's positions.
+        The clauses are ANDed, matching the filter semantics of the query service.
+        """
+        clauses = []
+        for key, filter_value in metadata_filter.items():
+            if not isinstance(filter_value, dict):
+                clauses.append(MetadataTable._compile_operator(key, '$eq', filter_value))
+                continue
+            # The key must be present even when no operator is given
+            clauses.append(lambda table, key=key: table._column_mask(key, lambda column: column.codes >= 0))
+            for op, value in filter_value.items():
+                clauses.append(MetadataTable._compile_operator(key, op, value))
+        return clauses
+    
+    @staticmethod
+    def _compile_operator(key: str, op: str, value: Any) -> Callable[["MetadataTable"], np.ndarray]:
+        if op in RANGE_OPERATORS:
+            compare = RANGE_OPERATORS[op]
+            if not is_number(value):
+                return MetadataTable._match_nothing
+            return lambda table: table._column_mask(key, lambda column: column.is_number & compare(column.numbers, value))
+        if op in VALUE_OPERATORS:
+            predicate = VALUE_OPERATORS[op]
+            return lambda table: table._column_mask(key, lambda column: column.match_values(lambda chunk_value: predicate(chunk_value, value)))
+        logger.warning(f"Unsupported filter operator: {op}")
+        return MetadataTable._match_nothing
+    
+    def _column_mask(self, key: str, evaluate: Callable[[MetadataColumn], np.ndarray]) -> np.ndarray:
+        column = self.columns.get(key)
+        if column is None:
+            return np.zeros(self.capacity, dtype=bool)
+        return evaluate(column)
+    
+    @staticmethod
+    def _match_nothing(table: "MetadataTable") -> np.ndarray:
+        return np.zeros(table.capacity, dtype=bool)
+    
+    def _clear_row(self, position: int):
+        self.live[position] = False
+        for column in self.columns.values():
+            column.clear(position)
+    
+    def _grow(self, capacity: int):
+        self.live = np.concatenate([self.live, np.zeros(capacity - self.capacity, dtype=bool)])
+        for column in self.columns.values():
+            column.grow(capacity)
+        self.capacity = capacity
+    
+    def estimate_memory_bytes(self) -> int:
+        return int(self.live.nbytes) + sum(
+            int(column.codes.nbytes + column.numbers.nbytes + column.is_number.nbytes) for column in self.columns.values()
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'positions': self.count,
+            'live': int(self.live[:self.count].sum()),
+            'columns': {key: len(column.values) for key, column in self.columns.items()}
+        }
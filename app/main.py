@@ -22,10 +22,10 @@ async def lifespan(app: FastAPI):
             os.makedirs(data_dir, exist_ok=True)
             logger.info(f"Created data directory: {data_dir}")
         
-        # Initialize database
+        # Create or upgrade the schema once, before any request touches the database
         logger.info("Initializing database")
-        from app.repositories.library_repository import LibraryRepository
-        repo = LibraryRepository()
+        from app.repositories.migrations import run_migrations
+        run_migrations()
         logger.info("Database initialized successfully")
         
         # Test cohere connection
@@ -45,6 +45,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Application shutting down")
+    from app.utils.index_flusher import index_flusher
+    index_flusher.stop()
+    from app.utils.embedding_batcher import embedding_batcher
+    embedding_batcher.stop()
+    from app.repositories.connection_pool import connection_pool
+    connection_pool.close_all()
 
 # Initialize FastAPI application with lifespan
 app = FastAPI(
@@ -75,7 +81,9 @@ async def root():
             "documents": "/libraries/{library_id}/documents",
             "chunks": "/libraries/{library_id}/documents/{document_id}/chunks",
             "indexing": "/libraries/{library_id}/index",
-            "search": "/libraries/{library_id}/search"
+            "search": "/libraries/{library_id}/search",
+            "batch_search": "/libraries/{library_id}/search/batch",
+            "metrics": "/metrics"
         }
     }
 
@@ -85,6 +93,20 @@ async def health_check():
     logger.info("Health check endpoint called")
     return {"status": "healthy", "service": "vector-database-api"}
 
+@app.get("/metrics")
+async def metrics():
+    """Cache statistics for monitoring"""
+    from app.utils.index_cache import index_cache
+    from app.utils.result_cache import result_cache
+    from app.utils.embedding_cache import embedding_cache
+    from app.utils.embedding_batcher import embedding_batcher
+    return {
+        "index_cache": index_cache.get_stats(),
+        "result_cache": result_cache.get_stats(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "embedding_batcher": embedding_batcher.get_stats()
+    }
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
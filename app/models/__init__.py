@@ -12,6 +12,7 @@ from app.models.models import (
     ChunkCreate,
     Chunk,
     SearchRequest,
+    BatchSearchRequest,
     SearchResult
 )
 
@@ -29,5 +30,6 @@ __all__ = [
     "ChunkCreate",
     "Chunk",
     "SearchRequest",
+    "BatchSearchRequest",
     "SearchResult"
 ]
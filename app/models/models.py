@@ -70,10 +70,42 @@ class Chunk(ChunkBase):
         from_attributes = True
 
 class SearchRequest(BaseModel):
-    query_embedding: List[float]
+    # Exactly one of these; query_text is embedded server-side with the search_query input type
+    query_embedding: Optional[List[float]] = None
+    query_text: Optional[str] = Field(None, min_length=1)
     k: int = Field(5, ge=1, le=100)
     metadata_filter: Optional[Dict] = None
+    # Per-query search knobs; unset values fall back to the defaults stored with the index
+    ef_search: Optional[int] = Field(None, ge=1, le=4096)
+    exact: bool = False
+    max_candidates: Optional[int] = Field(None, ge=1, le=10000)
+    # Return the query plan alongside the results
+    debug: bool = False
+
+class BatchSearchRequest(BaseModel):
+    query_embeddings: List[List[float]] = Field(..., min_length=1, max_length=100)
+    k: int = Field(5, ge=1, le=100)
+    metadata_filter: Optional[Dict] = None
+    ef_search: Optional[int] = Field(None, ge=1, le=4096)
+    exact: bool = False
+    max_candidates: Optional[int] = Field(None, ge=1, le=10000)
 
 class SearchResult(BaseModel):
     chunk: Chunk
     score: float
+
+class QueryPlan(BaseModel):
+    strategy: str
+    vector_count: int
+    candidate_count: int
+    allowed_count: Optional[int] = None
+    selectivity: Optional[float] = None
+    estimated_costs: Dict[str, float] = {}
+    fallback: Optional[str] = None
+    search_stats: Dict = {}
+    # Served from the result cache; the plan and stats are those of the search that filled it
+    cached: bool = False
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    debug: Optional[QueryPlan] = None
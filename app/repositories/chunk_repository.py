@@ -1,68 +1,106 @@
 import json
 import numpy as np
-import os
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 from app.repositories import BaseRepository
-from app.repositories.library_repository import LibraryRepository
-from app.repositories.document_repository import DocumentRepository
+from app.repositories.library_repository import library_repository
+from app.repositories.document_repository import document_repository
+from app.repositories.vector_store import VectorStore, get_vector_store
 from app.models.models import Chunk, ChunkCreate
 from app.core.logger import logger
 from app.core.config import settings
 
+EMBEDDING_DTYPE = np.dtype('<f4')
+# Bound on bound parameters per IN (...) query, below SQLite's historical limit of 999
+MAX_IN_PARAMETERS = 500
+CHUNK_COLUMNS_WITHOUT_EMBEDDING = "id, library_id, document_id, text, metadata, vector_index, created_at"
+
 class ChunkRepository(BaseRepository):
-    
     def __init__(self):
-        super().__init__()
-        data_dir = "data"
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir, exist_ok=True)
-            logger.info(f"Created data directory: {data_dir}")
+        # Libraries whose vector store was checked against the generation recorded in SQLite
+        self._synced_stores: Set[str] = set()
     
-    def _get_vector_file_path(self, library_id: str) -> str:
-        return f"data/vectors_{library_id}.npy"
+    def _get_vector_store(self, library_id: str) -> VectorStore:
+        store = get_vector_store(library_id)
+        if library_id not in self._synced_stores:
+            self._sync_vector_store_generation(library_id, store)
+        return store
     
-    def _load_vectors(self, library_id: str) -> np.ndarray:
-        file_path = self._get_vector_file_path(library_id)
-        if os.path.exists(file_path):
-            return np.load(file_path, allow_pickle=True)
-        return np.array([])
+    def _sync_vector_store_generation(self, library_id: str, store: VectorStore):
+        """
+        Finish a compaction whose row remap was committed but whose store never switched generation.
+        """
+        result = self.execute_query(
+            "SELECT generation FROM vector_store_generations WHERE library_id = ?",
+            (library_id,)
+        )
+        if result and result[0]["generation"] > store.generation:
+            logger.warning(f"Finishing interrupted vector compaction for library {library_id}: "
+                           f"generation {store.generation} -> {result[0]['generation']}")
+            store.switch_generation(result[0]["generation"])
+        self._synced_stores.add(library_id)
     
-    def _save_vectors(self, library_id: str, vectors: np.ndarray):
-        file_path = self._get_vector_file_path(library_id)
-        np.save(file_path, vectors)
+    @staticmethod
+    def _encode_embedding(embedding: Optional[List[float]]) -> Optional[bytes]:
+        # Packed little-endian float32, 4 bytes per dimension
+        if not embedding:
+            return None
+        return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+    
+    @staticmethod
+    def _decode_embedding(value) -> Optional[List[float]]:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Rows written before embeddings were stored as BLOBs
+            return json.loads(value)
+        return np.frombuffer(value, dtype=EMBEDDING_DTYPE).tolist()
+    
+    @staticmethod
+    def _columns(include_embeddings: bool) -> str:
+        return "*" if include_embeddings else CHUNK_COLUMNS_WITHOUT_EMBEDDING
+    
+    def _row_to_chunk(self, row, include_embeddings: bool = True) -> Chunk:
+        # Convert metadata from JSON and the embedding from its float32 BLOB
+        metadata = json.loads(row["metadata"]) if row["metadata"] else {}
+        embedding = self._decode_embedding(row["embedding"]) if include_embeddings else None
+        return Chunk(
+            id=row["id"],
+            library_id=row["library_id"],
+            document_id=row["document_id"],
+            text=row["text"],
+            embedding=embedding,
+            metadata=metadata,
+            created_at=row["created_at"]
+        )
     
     def create_chunk(self, library_id: str, document_id: Optional[str], chunk: ChunkCreate) -> Optional[Chunk]:
         logger.info(f"Creating chunk in library: {library_id}, document: {document_id}")
-        library_repo = LibraryRepository()
-        if not library_repo.get_library(library_id):
-            logger.error(f"Library not found: {library_id}")
-            return None
-        if document_id:
-            document_repo = DocumentRepository()
-            if not document_repo.get_document(library_id, document_id):
-                logger.error(f"Document not found: {document_id}")
+        with self.transaction():
+            if not library_repository.get_library(library_id):
+                logger.error(f"Library not found: {library_id}")
                 return None
+            if document_id:
+                if not document_repository.get_document(library_id, document_id):
+                    logger.error(f"Document not found: {document_id}")
+                    return None
     
-        chunk_obj = Chunk(**chunk.model_dump(), library_id=library_id, document_id=document_id)
-        vectors = self._load_vectors(library_id)
+            chunk_obj = Chunk(**chunk.model_dump(), library_id=library_id, document_id=document_id)
         
-        # Add new vector and get it's index
-        if chunk_obj.embedding:
-            vector_index = len(vectors)
-            vectors = np.append(vectors, [chunk_obj.embedding], axis=0) if len(vectors) > 0 else np.array([chunk_obj.embedding])
-        else:
-            vector_index = -1
-        self._save_vectors(library_id, vectors)
+            # Append the new vector to the library's store and record its row position
+            if chunk_obj.embedding:
+                vector_index = self._get_vector_store(library_id).append(chunk_obj.embedding)
+            else:
+                vector_index = -1
         
-        # Insert into database
-        self.execute_query(
-            "INSERT INTO chunks (id, library_id, document_id, text, embedding, metadata, vector_index, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (chunk_obj.id, chunk_obj.library_id, chunk_obj.document_id, chunk_obj.text,
-             json.dumps(chunk_obj.embedding) if chunk_obj.embedding else None,
-             json.dumps(chunk_obj.metadata.model_dump()), vector_index, chunk_obj.created_at)
-        )
-        logger.info(f"Chunk created with ID: {chunk_obj.id}")
-        return chunk_obj
+            # Insert into database
+            self.execute_query(
+                "INSERT INTO chunks (id, library_id, document_id, text, embedding, metadata, vector_index, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chunk_obj.id, chunk_obj.library_id, chunk_obj.document_id, chunk_obj.text,
+                 self._encode_embedding(chunk_obj.embedding),
+                 json.dumps(chunk_obj.metadata.model_dump()), vector_index, chunk_obj.created_at)
+            )
+            logger.info(f"Chunk created with ID: {chunk_obj.id}")
+            return chunk_obj
     
     def get_chunk(self, library_id: str, document_id: Optional[str], chunk_id: str) -> Optional[Chunk]:
         logger.info(f"Getting chunk: {chunk_id} from library: {library_id}, document: {document_id}")
@@ -81,131 +119,183 @@ class ChunkRepository(BaseRepository):
             return None
         row = result[0]
         
-        # Convert metadata and embedding from JSON string back to dict/list
-        metadata = json.loads(row["metadata"]) if row["metadata"] else {}
-        embedding = json.loads(row["embedding"]) if row["embedding"] else None
-        return Chunk(
-            id=row["id"],
-            library_id=row["library_id"],
-            document_id=row["document_id"],
-            text=row["text"],
-            embedding=embedding,
-            metadata=metadata,
-            created_at=row["created_at"]
-        )
+        return self._row_to_chunk(row)
     
-    def get_chunks_by_library(self, library_id: str) -> List[Chunk]:
+    def get_chunks_by_library(self, library_id: str, include_embeddings: bool = True) -> List[Chunk]:
         logger.info(f"Getting all chunks in library: {library_id}")
         result = self.execute_query(
-            "SELECT * FROM chunks WHERE library_id = ?",
+            f"SELECT {self._columns(include_embeddings)} FROM chunks WHERE library_id = ?",
             (library_id,)
         )
-        chunks = []
-        for row in result:
-            metadata = json.loads(row["metadata"]) if row["metadata"] else {}
-            embedding = json.loads(row["embedding"]) if row["embedding"] else None
-            chunks.append(Chunk(
-                id=row["id"],
-                library_id=row["library_id"],
-                document_id=row["document_id"],
-                text=row["text"],
-                embedding=embedding,
-                metadata=metadata,
-                created_at=row["created_at"]
-            ))
-        return chunks
+        return [self._row_to_chunk(row, include_embeddings) for row in result]
     
-    def get_chunks_by_document(self, library_id: str, document_id: str) -> List[Chunk]:
+    def get_chunks_by_document(self, library_id: str, document_id: str, include_embeddings: bool = True) -> List[Chunk]:
         logger.info(f"Getting all chunks in document: {document_id} from library: {library_id}")
         result = self.execute_query(
-            "SELECT * FROM chunks WHERE library_id = ? AND document_id = ?",
+            f"SELECT {self._columns(include_embeddings)} FROM chunks WHERE library_id = ? AND document_id = ?",
             (library_id, document_id)
         )
-        chunks = []
-        for row in result:
-            metadata = json.loads(row["metadata"]) if row["metadata"] else {}
-            embedding = json.loads(row["embedding"]) if row["embedding"] else None
-            chunks.append(Chunk(
-                id=row["id"],
-                library_id=row["library_id"],
-                document_id=row["document_id"],
-                text=row["text"],
-                embedding=embedding,
-                metadata=metadata,
-                created_at=row["created_at"]
-            ))
+        return [self._row_to_chunk(row, include_embeddings) for row in result]
+    
+    def get_indexed_chunks(self, library_id: str, include_embeddings: bool = True) -> List[Chunk]:
+        """
+        Chunks that have a stored vector, in the same order get_all_vectors returns them.
+        """
+        result = self.execute_query(
+            f"SELECT {self._columns(include_embeddings)} FROM chunks WHERE library_id = ? AND vector_index >= 0 ORDER BY rowid",
+            (library_id,)
+        )
+        return [self._row_to_chunk(row, include_embeddings) for row in result]
+    
+    def get_chunks_by_ids(self, library_id: str, chunk_ids: List[str], include_embeddings: bool = True) -> Dict[str, Chunk]:
+        """
+        The given chunks of a library keyed by id, looked up through the primary key. Missing ids are left out.
+        """
+        chunks = {}
+        unique_ids = list(dict.fromkeys(chunk_ids))
+        for start in range(0, len(unique_ids), MAX_IN_PARAMETERS):
+            batch = unique_ids[start:start + MAX_IN_PARAMETERS]
+            result = self.execute_query(
+                f"SELECT {self._columns(include_embeddings)} FROM chunks WHERE library_id = ? AND id IN ({', '.join('?' * len(batch))})",
+                (library_id, *batch)
+            )
+            for row in result:
+                chunks[row["id"]] = self._row_to_chunk(row, include_embeddings)
         return chunks
     
-    def get_all_vectors(self, library_id: str) -> Tuple[List[Chunk], np.ndarray]:
+    def get_indexed_metadata(self, library_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        (chunk id, metadata) of chunks that have a stored vector, in get_all_vectors order, without loading text or embeddings.
+        """
+        result = self.execute_query(
+            "SELECT id, metadata FROM chunks WHERE library_id = ? AND vector_index >= 0 ORDER BY rowid",
+            (library_id,)
+        )
+        return [(row["id"], json.loads(row["metadata"]) if row["metadata"] else {}) for row in result]
+    
+    def get_all_vectors(self, library_id: str) -> Tuple[List[str], np.ndarray]:
+        """
+        Chunk ids and their vectors for a library, ordered by insertion.
+        One projected query (no text or embedding columns) feeds a single gather from the vector store.
+        """
         logger.info(f"Getting all vectors for library: {library_id}")
-        chunks = self.get_chunks_by_library(library_id)
-        vectors = self._load_vectors(library_id)
-        chunks_with_embeddings = [chunk for chunk in chunks if chunk.embedding is not None]
-        vector_indices = []
-        valid_vectors = []
-        for i, chunk in enumerate(chunks):
-            if chunk.embedding is not None:
-                result = self.execute_query(
-                    "SELECT vector_index FROM chunks WHERE id = ?",
-                    (chunk.id,)
-                )
-                if result and result[0]["vector_index"] >= 0:
-                    vector_indices.append(result[0]["vector_index"])
-        
-        if len(vector_indices) > 0:
-            valid_vectors = vectors[vector_indices]
-        return chunks_with_embeddings, valid_vectors
+        result = self.execute_query(
+            "SELECT id, vector_index FROM chunks WHERE library_id = ? AND vector_index >= 0 ORDER BY rowid",
+            (library_id,)
+        )
+        chunk_ids = [row["id"] for row in result]
+        if not chunk_ids:
+            return [], np.empty((0, 0), dtype=np.float32)
+        vector_indices = np.fromiter((row["vector_index"] for row in result), dtype=np.int64, count=len(result))
+        return chunk_ids, self._get_vector_store(library_id).take(vector_indices)
     
     def update_chunk(self, library_id: str, document_id: Optional[str], chunk_id: str, chunk: ChunkCreate) -> Optional[Chunk]:
         logger.info(f"Updating chunk: {chunk_id} in library: {library_id}, document: {document_id}")
-        existing_chunk = self.get_chunk(library_id, document_id, chunk_id)
-        if not existing_chunk:
-            return None
-        self.execute_query(
-            "UPDATE chunks SET text = ?, embedding = ?, metadata = ? WHERE id = ? AND library_id = ? AND document_id = ?",
-            (chunk.text, json.dumps(chunk.embedding) if chunk.embedding else None, 
-             json.dumps(chunk.metadata.model_dump()), chunk_id, library_id, document_id)
-        )
-        if chunk.embedding and chunk.embedding != existing_chunk.embedding:
-            vectors = self._load_vectors(library_id)
-            result = self.execute_query(
-                "SELECT vector_index FROM chunks WHERE id = ?",
-                (chunk_id,)
+        with self.transaction():
+            existing_chunk = self.get_chunk(library_id, document_id, chunk_id)
+            if not existing_chunk:
+                return None
+            self.execute_query(
+                "UPDATE chunks SET text = ?, embedding = ?, metadata = ? WHERE id = ? AND library_id = ? AND document_id = ?",
+                (chunk.text, self._encode_embedding(chunk.embedding), 
+                 json.dumps(chunk.metadata.model_dump()), chunk_id, library_id, document_id)
             )
-            if result and result[0]["vector_index"] >= 0:
-                # Update the vector
-                vectors[result[0]["vector_index"]] = chunk.embedding
-                self._save_vectors(library_id, vectors)
+            if chunk.embedding and chunk.embedding != existing_chunk.embedding:
+                store = self._get_vector_store(library_id)
+                result = self.execute_query(
+                    "SELECT vector_index FROM chunks WHERE id = ?",
+                    (chunk_id,)
+                )
+                if result and result[0]["vector_index"] is not None and result[0]["vector_index"] >= 0:
+                    # Overwrite the vector in place
+                    store.update(result[0]["vector_index"], chunk.embedding)
+                else:
+                    vector_index = store.append(chunk.embedding)
+                    self.execute_query(
+                        "UPDATE chunks SET vector_index = ? WHERE id = ?",
+                        (vector_index, chunk_id)
+                    )
         
-        # Return updated chunk
-        return self.get_chunk(library_id, document_id, chunk_id)
+            # Return updated chunk
+            return self.get_chunk(library_id, document_id, chunk_id)
     
     def delete_chunk(self, library_id: str, document_id: Optional[str], chunk_id: str) -> bool:
         logger.info(f"Deleting chunk: {chunk_id} from library: {library_id}, document: {document_id}")
-        existing_chunk = self.get_chunk(library_id, document_id, chunk_id)
-        if not existing_chunk:
-            return False
+        with self.transaction():
+            existing_chunk = self.get_chunk(library_id, document_id, chunk_id)
+            if not existing_chunk:
+                return False
         
-        if existing_chunk.embedding:
-            vectors = self._load_vectors(library_id)
-            result = self.execute_query(
-                "SELECT vector_index FROM chunks WHERE id = ?",
-                (chunk_id,)
-            )
-            if result and result[0]["vector_index"] >= 0:
-                vectors[result[0]["vector_index"]] = np.zeros_like(vectors[result[0]["vector_index"]])
-                self._save_vectors(library_id, vectors)
+            if existing_chunk.embedding:
+                result = self.execute_query(
+                    "SELECT vector_index FROM chunks WHERE id = ?",
+                    (chunk_id,)
+                )
+                if result and result[0]["vector_index"] is not None and result[0]["vector_index"] >= 0:
+                    self._get_vector_store(library_id).delete(result[0]["vector_index"])
         
-        if document_id:
-            self.execute_query(
-                "DELETE FROM chunks WHERE id = ? AND library_id = ? AND document_id = ?",
-                (chunk_id, library_id, document_id)
+            if document_id:
+                self.execute_query(
+                    "DELETE FROM chunks WHERE id = ? AND library_id = ? AND document_id = ?",
+                    (chunk_id, library_id, document_id)
+                )
+            else:
+                self.execute_query(
+                    "DELETE FROM chunks WHERE id = ? AND library_id = ? AND document_id IS NULL",
+                    (chunk_id, library_id)
+                )
+            logger.info(f"Chunk deleted: {chunk_id}")
+            return True
+    
+    def delete_document_chunks(self, library_id: str, document_id: str) -> Optional[List[str]]:
+        """
+        Delete a document together with its chunks, tombstoning their vectors.
+        Returns the deleted chunk ids, or None if the document doesn't exist.
+        """
+        logger.info(f"Deleting document: {document_id} and its chunks from library: {library_id}")
+        with self.transaction():
+            rows = self.execute_query(
+                "SELECT id, vector_index FROM chunks WHERE library_id = ? AND document_id = ?",
+                (library_id, document_id)
             )
-        else:
-            self.execute_query(
-                "DELETE FROM chunks WHERE id = ? AND library_id = ? AND document_id IS NULL",
-                (chunk_id, library_id)
+            # The chunk rows go with the document (ON DELETE CASCADE)
+            if not document_repository.delete_document(library_id, document_id):
+                return None
+            store = self._get_vector_store(library_id)
+            for row in rows:
+                if row["vector_index"] is not None and row["vector_index"] >= 0:
+                    store.delete(row["vector_index"])
+            logger.info(f"Deleted {len(rows)} chunks of document: {document_id}")
+            return [row["id"] for row in rows]
+    
+    def needs_compaction(self, library_id: str) -> bool:
+        store = self._get_vector_store(library_id)
+        dead = int(store.tombstones().sum())
+        return dead >= settings.VECTOR_COMPACTION_MIN_DEAD and dead >= settings.VECTOR_COMPACTION_DEAD_RATIO * store.count
+    
+    def compact_vectors(self, library_id: str) -> int:
+        """
+        Drop tombstoned vectors from the library's store and remap chunk vector_index values.
+        Callers must hold the library lock. Returns the number of rows reclaimed.
+        """
+        store = self._get_vector_store(library_id)
+        old_count = store.count
+        # New rows are written first and the old ones stay current until the remap is committed.
+        # The remap records the generation it refers to, so a crash before the switch is finished on next open.
+        generation, mapping = store.prepare_compaction()
+        rows = self.execute_query(
+            "SELECT id, vector_index FROM chunks WHERE library_id = ? AND vector_index >= 0",
+            (library_id,)
+        )
+        updates = [(int(mapping[row["vector_index"]]), row["id"]) for row in rows if row["vector_index"] < len(mapping)]
+        with self.transaction() as conn:
+            conn.executemany("UPDATE chunks SET vector_index = ? WHERE id = ?", updates)
+            conn.execute(
+                "INSERT OR REPLACE INTO vector_store_generations (library_id, generation) VALUES (?, ?)",
+                (library_id, generation)
             )
-        logger.info(f"Chunk deleted: {chunk_id}")
-        return True
-    
\ No newline at end of file
+        store.switch_generation(generation)
+        logger.info(f"Compacted vectors for library {library_id}: reclaimed {old_count - store.count} rows")
+        return old_count - store.count
+
+chunk_repository = ChunkRepository()
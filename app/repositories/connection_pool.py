@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.logger import logger
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection subclass so the pool can track connections weakly
+    and count transaction nesting per connection.
+    """
+    transaction_depth = 0
+
+class ConnectionPool:
+    """
+    Per-thread persistent SQLite connections.
+    
+    Each thread keeps one open connection per database file, configured once with
+    WAL journaling and the performance pragmas from settings. Connections run in
+    autocommit mode; multi-statement work is grouped with BaseRepository.transaction().
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._all: "weakref.WeakSet[PooledConnection]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def get_db_path() -> str:
+        # Extract database file path from URL
+        return settings.DATABASE_URL.replace("sqlite:///", "")
+    
+    def get(self, db_path: Optional[str] = None) -> PooledConnection:
+        db_path = db_path or self.get_db_path()
+        connections: Dict[str, PooledConnection] = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = self._connect(db_path)
+            connections[db_path] = conn
+        return conn
+    
+    def _connect(self, db_path: str) -> PooledConnection:
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+            logger.info(f"Created database directory: {db_dir}")
+        
+        conn = sqlite3.connect(
+            db_path,
+            factory=PooledConnection,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=settings.SQLITE_CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row   # Return rows as dictionaries
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+        conn.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        with self._lock:
+            self._all.add(conn)
+        logger.debug(f"Opened pooled SQLite connection to {db_path} for thread {threading.get_ident()}")
+        return conn
+    
+    def close_all(self):
+        with self._lock:
+            connections = list(self._all)
+            self._all = weakref.WeakSet()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing SQLite connection: {e}")
+        # Threads that held a closed connection will reconnect on next use
+        self._local = threading.local()
+
+connection_pool = ConnectionPool()
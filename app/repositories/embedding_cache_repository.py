@@ -0,0 +1,31 @@
+import numpy as np
+from typing import List, Optional
+from app.repositories import BaseRepository
+from app.repositories.chunk_repository import EMBEDDING_DTYPE
+from app.core.logger import logger
+
+class EmbeddingCacheRepository(BaseRepository):
+    """
+    Embeddings already computed by the embedding provider, keyed by (model, input_type, text_hash).
+    Rows are shared by every process using the database and survive restarts.
+    """
+    def get_embedding(self, model: str, input_type: str, text_hash: str) -> Optional[List[float]]:
+        result = self.execute_query(
+            "SELECT embedding FROM embedding_cache WHERE model = ? AND input_type = ? AND text_hash = ?",
+            (model, input_type, text_hash)
+        )
+        if not result:
+            return None
+        return np.frombuffer(result[0]["embedding"], dtype=EMBEDDING_DTYPE).tolist()
+    
+    def put_embedding(self, model: str, input_type: str, text_hash: str, embedding: List[float]):
+        logger.debug(f"Storing {input_type} embedding {text_hash[:12]} for model {model}")
+        self.execute_query(
+            "INSERT OR REPLACE INTO embedding_cache (model, input_type, text_hash, embedding) VALUES (?, ?, ?, ?)",
+            (model, input_type, text_hash, np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes())
+        )
+    
+    def count_embeddings(self) -> int:
+        return self.execute_query("SELECT COUNT(*) AS count FROM embedding_cache")[0]["count"]
+
+embedding_cache_repository = EmbeddingCacheRepository()
@@ -52,21 +52,25 @@ class LibraryRepository(BaseRepository):
     
     def update_library(self, library_id: str, library: LibraryCreate) -> Optional[Library]:
         logger.info(f"Updating library: {library_id}")
-        existing_library = self.get_library(library_id)
-        if not existing_library:
-            return None
-        self.execute_query(
-            "UPDATE libraries SET name = ?, metadata = ? WHERE id = ?",
-            (library.name, json.dumps(library.metadata.model_dump()), library_id)
-        )
-        return self.get_library(library_id)
+        with self.transaction():
+            existing_library = self.get_library(library_id)
+            if not existing_library:
+                return None
+            self.execute_query(
+                "UPDATE libraries SET name = ?, metadata = ? WHERE id = ?",
+                (library.name, json.dumps(library.metadata.model_dump()), library_id)
+            )
+            return self.get_library(library_id)
     
     def delete_library(self, library_id: str) -> bool:
         logger.info(f"Deleting library: {library_id}")
-        existing_library = self.get_library(library_id)
-        if not existing_library:
-            return False
-        self.execute_query("DELETE FROM libraries WHERE id = ?", (library_id,))
-        logger.info(f"Library deleted: {library_id}")
-        return True
-    
\ No newline at end of file
+        with self.transaction():
+            existing_library = self.get_library(library_id)
+            if not existing_library:
+                return False
+            self.execute_query("DELETE FROM libraries WHERE id = ?", (library_id,))
+            logger.info(f"Library deleted: {library_id}")
+            return True
+    
+
+library_repository = LibraryRepository()
@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import numpy as np
+from typing import Callable, List, NamedTuple
+from app.repositories.connection_pool import connection_pool
+from app.core.logger import logger
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+def _create_base_tables(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS libraries (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            metadata TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            library_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            metadata TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (library_id) REFERENCES libraries (id) ON DELETE CASCADE
+        )
+    """)
+    
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            id TEXT PRIMARY KEY,
+            library_id TEXT NOT NULL,
+            document_id TEXT,
+            text TEXT NOT NULL,
+            embedding BLOB,
+            metadata TEXT,
+            vector_index INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (library_id) REFERENCES libraries (id) ON DELETE CASCADE,
+            FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+        )
+    """)
+
+def _migrate_embeddings_to_blob(conn: sqlite3.Connection, batch_size: int = 1000):
+    """
+    Rewrite embeddings stored as JSON text into packed little-endian float32 BLOBs.
+    """
+    migrated = 0
+    while True:
+        # Converted rows stop matching the filter, so each pass picks up the next batch
+        rows = conn.execute(
+            "SELECT id, embedding FROM chunks WHERE typeof(embedding) = 'text' LIMIT ?",
+            (batch_size,)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "UPDATE chunks SET embedding = ? WHERE id = ?",
+            [(np.asarray(json.loads(row["embedding"]), dtype='<f4').tobytes(), row["id"]) for row in rows]
+        )
+        migrated += len(rows)
+    if migrated:
+        logger.info(f"Migrated {migrated} chunk embeddings from JSON text to float32 BLOBs")
+
+def _create_lookup_indexes(conn: sqlite3.Connection):
+    # Library/document scoped reads; the leading library_id column also serves ON DELETE CASCADE from libraries
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_library_document ON chunks (library_id, document_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_library_vector ON chunks (library_id, vector_index)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_library ON documents (library_id)")
+    # Cascading deletes from documents look up chunks by document_id alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks (document_id)")
+
+def _create_embedding_cache(conn: sqlite3.Connection):
+    # Embeddings are float32 BLOBs like chunks.embedding; the key is the model, the input type and the text's SHA-256
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model TEXT NOT NULL,
+            input_type TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (model, input_type, text_hash)
+        ) WITHOUT ROWID
+    """)
+
+def _create_vector_store_generations(conn: sqlite3.Connection):
+    # The vector store generation that chunks.vector_index refers to, committed together with a compaction's remap
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vector_store_generations (
+            library_id TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            FOREIGN KEY (library_id) REFERENCES libraries (id) ON DELETE CASCADE
+        )
+    """)
+
+# Append only: never renumber or edit a migration once it has shipped.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create libraries, documents and chunks tables", _create_base_tables),
+    Migration(2, "Store chunk embeddings as float32 BLOBs", _migrate_embeddings_to_blob),
+    Migration(3, "Add library and document lookup indexes", _create_lookup_indexes),
+    Migration(4, "Create persistent embedding cache", _create_embedding_cache),
+    Migration(5, "Record the vector store generation chunk rows refer to", _create_vector_store_generations),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations() -> int:
+    """
+    Bring the configured database up to the latest schema version.
+    Each migration runs in its own write transaction and bumps PRAGMA user_version,
+    so concurrent starters serialize and already-applied steps are skipped.
+    """
+    conn = connection_pool.get()
+    for migration in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read inside the write lock in case another process just migrated
+            if get_schema_version(conn) >= migration.version:
+                conn.execute("ROLLBACK")
+                continue
+            logger.info(f"Applying database migration {migration.version}: {migration.description}")
+            migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    version = get_schema_version(conn)
+    logger.info(f"Database schema at version {version}")
+    return version
@@ -0,0 +1,294 @@
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+
+RECORD_DTYPE = np.dtype('<f4')
+MANIFEST_VERSION = 1
+
+class VectorStore:
+    """
+    Append-only, segmented float32 vector storage for a single library.
+    
+    Rows are fixed-size records; row i lives in segment i // segment_capacity, so a
+    row's position never changes until compaction. Inserts append to the active
+    segment, updates overwrite the record in place and deletes set a tombstone byte.
+    Reads go through read-only memory maps of the segment files.
+    """
+    def __init__(self, directory: str, segment_capacity: Optional[int] = None):
+        self.directory = directory
+        self.dim: Optional[int] = None
+        self.segment_capacity = segment_capacity or settings.VECTOR_SEGMENT_CAPACITY
+        self.generation = 0
+        self.count = 0
+        self._maps: Dict[int, np.memmap] = {}
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_manifest()
+    
+    # ---- layout helpers -------------------------------------------------
+    
+    @property
+    def record_size(self) -> int:
+        return self.dim * RECORD_DTYPE.itemsize
+    
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+    
+    def _segment_path(self, segment: int, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"g{generation}_seg{segment:06d}.f32")
+    
+    def _tombstone_path(self, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"g{generation}_tombstones.u8")
+    
+    def _load_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            self._write_manifest()
+            return
+        with open(path) as f:
+            manifest = json.load(f)
+        self.dim = manifest.get('dim')
+        self.segment_capacity = manifest.get('segment_capacity', self.segment_capacity)
+        self.generation = manifest.get('generation', 0)
+        self.count = self._count_rows()
+    
+    def _write_manifest(self):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'dim': self.dim,
+                'segment_capacity': self.segment_capacity,
+                'generation': self.generation
+            }, f)
+        os.replace(tmp_path, self._manifest_path())
+    
+    def _count_rows(self) -> int:
+        # Segments fill up in order, so the row count follows from the segment file sizes
+        if not self.dim:
+            return 0
+        count = 0
+        segment = 0
+        while os.path.exists(self._segment_path(segment)):
+            path = self._segment_path(segment)
+            size = os.path.getsize(path)
+            if size % self.record_size:
+                # A torn append from a crash; drop the partial record so later appends stay aligned
+                logger.warning(f"Truncating partial record at end of {path}")
+                size -= size % self.record_size
+                os.truncate(path, size)
+            count += size // self.record_size
+            segment += 1
+        return count
+    
+    def _to_record(self, vector) -> np.ndarray:
+        record = np.asarray(vector, dtype=RECORD_DTYPE).reshape(-1)
+        if self.dim is None:
+            self.dim = len(record)
+            self._write_manifest()
+        elif len(record) != self.dim:
+            raise ValueError(f"Vector dimension {len(record)} doesn't match store dimension {self.dim}")
+        return record
+    
+    # ---- writes ---------------------------------------------------------
+    
+    def append(self, vector) -> int:
+        """
+        Append one vector and return its row position.
+        """
+        return self.append_many([vector])[0]
+    
+    def append_many(self, vectors) -> List[int]:
+        with self._lock:
+            records = [self._to_record(vector) for vector in vectors]
+            start = self.count
+            written = 0
+            while written < len(records):
+                segment, offset = divmod(self.count, self.segment_capacity)
+                batch = records[written:written + self.segment_capacity - offset]
+                with open(self._segment_path(segment), 'ab') as f:
+                    f.write(np.stack(batch).tobytes())
+                written += len(batch)
+                self.count += len(batch)
+            with open(self._tombstone_path(), 'ab') as f:
+                f.write(b"\x00" * len(records))
+            return list(range(start, self.count))
+    
+    def update(self, row: int, vector):
+        with self._lock:
+            self._check_row(row)
+            record = self._to_record(vector)
+            segment, offset = divmod(row, self.segment_capacity)
+            with open(self._segment_path(segment), 'r+b') as f:
+                f.seek(offset * self.record_size)
+                f.write(record.tobytes())
+    
+    def delete(self, row: int):
+        with self._lock:
+            self._check_row(row)
+            with open(self._tombstone_path(), 'r+b') as f:
+                f.seek(row)
+                f.write(b"\x01")
+    
+    def _check_row(self, row: int):
+        if row < 0 or row >= self.count:
+            raise IndexError(f"Row {row} out of range for store with {self.count} rows")
+    
+    # ---- reads ----------------------------------------------------------
+    
+    def _segment_map(self, segment: int) -> np.ndarray:
+        rows = min(self.segment_capacity, self.count - segment * self.segment_capacity)
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) != rows:
+            # The active segment grows on append, so its map is refreshed when the row count changes
+            mapped = np.memmap(self._segment_path(segment), dtype=RECORD_DTYPE, mode='r', shape=(rows, self.dim))
+            self._maps[segment] = mapped
+        return mapped
+    
+    def segments(self) -> List[np.ndarray]:
+        """
+        Read-only memory-mapped (rows, dim) views, one per segment, in row order.
+        """
+        with self._lock:
+            if not self.count:
+                return []
+            num_segments = (self.count + self.segment_capacity - 1) // self.segment_capacity
+            return [self._segment_map(segment) for segment in range(num_segments)]
+    
+    def read_all(self) -> np.ndarray:
+        segments = self.segments()
+        if not segments:
+            return np.empty((0, self.dim or 0), dtype=RECORD_DTYPE)
+        if len(segments) == 1:
+            return segments[0]
+        return np.concatenate(segments)
+    
+    def take(self, rows) -> np.ndarray:
+        """
+        Gather the given row positions (fancy indexing across segments) into one array.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        segments = self.segments()
+        result = np.empty((len(rows), self.dim or 0), dtype=RECORD_DTYPE)
+        if len(rows) == 0:
+            return result
+        segment_ids = rows // self.segment_capacity
+        offsets = rows % self.segment_capacity
+        for segment in np.unique(segment_ids):
+            mask = segment_ids == segment
+            result[mask] = segments[segment][offsets[mask]]
+        return result
+    
+    def tombstones(self) -> np.ndarray:
+        with self._lock:
+            if not self.count:
+                return np.zeros(0, dtype=bool)
+            dead = np.zeros(self.count, dtype=bool)
+            if os.path.exists(self._tombstone_path()):
+                marks = np.fromfile(self._tombstone_path(), dtype=np.uint8, count=self.count)
+                dead[:len(marks)] = marks.astype(bool)
+            return dead
+    
+    def dead_ratio(self) -> float:
+        return float(self.tombstones().mean()) if self.count else 0.0
+    
+    # ---- compaction -----------------------------------------------------
+    
+    def compact(self) -> np.ndarray:
+        """
+        Rewrite live rows into a new generation of segments and switch to it.
+        Returns an old row -> new row mapping (-1 for rows that were dropped).
+        """
+        with self._lock:
+            generation, mapping = self.prepare_compaction()
+            self.switch_generation(generation)
+            return mapping
+    
+    def prepare_compaction(self) -> Tuple[int, np.ndarray]:
+        """
+        Write the live rows into the next generation's files without switching to them, so a
+        caller can commit its own row remap before switch_generation() makes the new rows current.
+        Returns the new generation and the old row -> new row mapping (-1 for dropped rows).
+        """
+        with self._lock:
+            dead = self.tombstones()
+            mapping = np.full(self.count, -1, dtype=np.int64)
+            live_rows = np.flatnonzero(~dead)
+            mapping[live_rows] = np.arange(len(live_rows))
+            new_generation = self.generation + 1
+            # Files left by an earlier compaction that never switched would be counted as rows
+            self._remove_generation(new_generation)
+            
+            for segment, start in enumerate(range(0, len(live_rows), self.segment_capacity)):
+                records = self.take(live_rows[start:start + self.segment_capacity])
+                with open(self._segment_path(segment, new_generation), 'wb') as f:
+                    f.write(records.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(self._tombstone_path(new_generation), 'wb') as f:
+                f.write(b"\x00" * len(live_rows))
+                f.flush()
+                os.fsync(f.fileno())
+            return new_generation, mapping
+    
+    def switch_generation(self, generation: int):
+        """
+        Make a generation written by prepare_compaction() current and delete the previous one.
+        Rewriting the manifest is the commit point; switching to the current generation is a no-op.
+        """
+        with self._lock:
+            if generation == self.generation:
+                return
+            old_generation, old_count = self.generation, self.count
+            self._maps.clear()
+            self.generation = generation
+            self.count = self._count_rows()
+            self._write_manifest()
+            self._remove_generation(old_generation)
+            logger.info(f"Compacted vector store {self.directory}: {old_count} -> {self.count} rows")
+    
+    def _remove_generation(self, generation: int):
+        segment = 0
+        paths = []
+        while os.path.exists(self._segment_path(segment, generation)):
+            paths.append(self._segment_path(segment, generation))
+            segment += 1
+        if os.path.exists(self._tombstone_path(generation)):
+            paths.append(self._tombstone_path(generation))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove old vector segment {path}: {e}")
+
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_vector_store(library_id: str, data_dir: str = "data") -> VectorStore:
+    """
+    Process-wide VectorStore for a library. Existing data/vectors_{library_id}.npy files
+    are imported once, preserving row positions so stored vector_index values stay valid,
+    and then renamed with a .migrated suffix.
+    """
+    with _stores_lock:
+        store = _stores.get(library_id)
+        if store is not None:
+            return store
+        directory = os.path.join(data_dir, f"vectors_{library_id}")
+        legacy_path = os.path.join(data_dir, f"vectors_{library_id}.npy")
+        store = VectorStore(directory)
+        if store.count == 0 and os.path.exists(legacy_path):
+            legacy_vectors = np.load(legacy_path, allow_pickle=False)
+            if len(legacy_vectors) > 0:
+                store.append_many(list(legacy_vectors))
+            # Otherwise a store that compaction later empties would import the old vectors again
+            os.replace(legacy_path, legacy_path + ".migrated")
+            logger.info(f"Migrated {len(legacy_vectors)} vectors from {legacy_path} into {directory}")
+        _stores[library_id] = store
+        return store
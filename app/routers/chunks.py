@@ -9,8 +9,10 @@ router = APIRouter()
 def get_chunk_service():
     return ChunkService()
 
+# Plain def so FastAPI runs it in its threadpool: embedding blocks on the batcher, and concurrent
+# requests have to be waiting together for their texts to share an embed call
 @router.post("/", response_model=Chunk, status_code=status.HTTP_201_CREATED)
-async def create_chunk(
+def create_chunk(
     library_id: str = Path(..., description="ID of the library"),
     document_id: str = Path(..., description="ID of the document"),
     chunk: ChunkCreate = None,
@@ -96,7 +98,7 @@ async def get_chunk(
         )
 
 @router.put("/{chunk_id}", response_model=Chunk)
-async def update_chunk(
+def update_chunk(
     library_id: str = Path(..., description="ID of the library"),
     document_id: str = Path(..., description="ID of the document"),
     chunk_id: str = Path(..., description="ID of the chunk"),
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Path
-from typing import List
+from typing import List, Union
 from app.services.query_service import QueryService
-from app.models.models import SearchRequest, SearchResult
+from app.models.models import SearchRequest, BatchSearchRequest, SearchResult, SearchResponse
 from app.core.logger import logger
 
 router = APIRouter()
@@ -9,8 +9,10 @@ router = APIRouter()
 def get_query_service():
     return QueryService()
 
-@router.post("/", response_model=List[SearchResult])
-async def search(
+# Plain def so FastAPI runs it in its threadpool: query_text blocks on the embedding batcher,
+# which would otherwise stall the event loop for every other request
+@router.post("/", response_model=Union[List[SearchResult], SearchResponse])
+def search(
     library_id: str = Path(..., description="ID of the library"),
     search_request: SearchRequest = None,
     index_type: str = "HNSW",
@@ -22,6 +24,9 @@ async def search(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Search request data is required"
             )
+        if search_request.debug:
+            results, plan = query_service.search_with_plan(library_id, search_request, index_type)
+            return SearchResponse(results=results, debug=plan)
         results = query_service.search(library_id, search_request, index_type)
         return results
     except ValueError as e:
@@ -38,4 +43,34 @@ async def search(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
-    
\ No newline at end of file
+    
+# Plain def for the same reason: the distance kernels and chunk hydration would block the event loop
+@router.post("/batch", response_model=List[List[SearchResult]])
+def search_batch(
+    library_id: str = Path(..., description="ID of the library"),
+    batch_request: BatchSearchRequest = None,
+    index_type: str = "HNSW",
+    query_service: QueryService = Depends(get_query_service)
+):
+    try:
+        if batch_request is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch search request data is required"
+            )
+        results = query_service.search_batch(library_id, batch_request, index_type)
+        return results
+    except ValueError as e:
+        logger.error(f"Value error performing batch search: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error performing batch search: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
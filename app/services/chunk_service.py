@@ -1,17 +1,24 @@
+import threading
+import numpy as np
 from typing import List, Optional, Tuple
-from app.repositories.chunk_repository import ChunkRepository
-from app.repositories.library_repository import LibraryRepository
-from app.repositories.document_repository import DocumentRepository
-from app.utils.cohere_client import cohere_client
+from app.repositories.chunk_repository import chunk_repository
+from app.repositories.library_repository import library_repository
+from app.repositories.document_repository import document_repository
+from app.utils.embedding_cache import embedding_cache
 from app.utils.locking import lock_manager
+from app.services.indexing_service import IndexingService
 from app.models.models import Chunk, ChunkCreate
 from app.core.logger import logger
+from app.core.config import settings
 
 class ChunkService: 
     def __init__(self):
-        self.repository = ChunkRepository()
-        self.library_repository = LibraryRepository()
-        self.document_repository = DocumentRepository()
+        self.repository = chunk_repository
+        self.library_repository = library_repository
+        self.document_repository = document_repository
+        self.indexing_service = IndexingService()
+        # Content-addressed, so re-ingesting unchanged text reuses its stored embedding instead of calling Cohere
+        self.embedding_cache = embedding_cache
     
     def create_chunk(self, library_id: str, document_id: Optional[str], chunk_data: ChunkCreate) -> Optional[Chunk]:
         logger.info(f"Creating chunk in library: {library_id}, document: {document_id}")
@@ -37,7 +44,7 @@ class ChunkService:
         # Generate embedding
         if not chunk_data.embedding:
             logger.info(f"Generating embedding for chunk text: {chunk_data.text[:50]}")
-            embedding = cohere_client.get_embedding(chunk_data.text)
+            embedding = self.embedding_cache.get_embedding(chunk_data.text, settings.COHERE_INPUT_TYPE, remember=False)
             if not embedding:
                 logger.error("Failed to generate embedding for chunk")
                 raise ValueError("Failed to generate embedding for chunk")
@@ -51,6 +58,7 @@ class ChunkService:
             if not chunk:
                 logger.error(f"Failed to create chunk in library: {library_id}")
                 return None
+            self.indexing_service.add_chunk(library_id, chunk.id, chunk.embedding, chunk.metadata)
             logger.info(f"Chunk created successfully: {chunk.id}")
             return chunk
     
@@ -121,7 +129,7 @@ class ChunkService:
         logger.info(f"Retrieved {len(chunks)} chunks from document: {document_id}")
         return chunks
     
-    def get_all_vectors(self, library_id: str) -> Tuple[List[Chunk], List[List[float]]]:
+    def get_all_vectors(self, library_id: str) -> Tuple[List[str], np.ndarray]:
         logger.info(f"Getting vectors for library: {library_id}")
         
         if not library_id or not library_id.strip():
@@ -133,9 +141,9 @@ class ChunkService:
             logger.error(f"Library not found: {library_id}")
             raise ValueError(f"Library not found: {library_id}")
         
-        chunks, vectors = self.repository.get_all_vectors(library_id)
-        logger.info(f"Retrieved {len(chunks)} vectors from library: {library_id}")
-        return chunks, vectors
+        chunk_ids, vectors = self.repository.get_all_vectors(library_id)
+        logger.info(f"Retrieved {len(chunk_ids)} vectors from library: {library_id}")
+        return chunk_ids, vectors
     
     def update_chunk(self, library_id: str, document_id: Optional[str], chunk_id: str, chunk_data: ChunkCreate) -> Optional[Chunk]:
         logger.info(f"Updating chunk: {chunk_id} in library: {library_id}, document: {document_id}")
@@ -170,7 +178,7 @@ class ChunkService:
         # Generate embedding if not provided and text has changed
         if not chunk_data.embedding and chunk_data.text != existing_chunk.text:
             logger.info(f"Generating embedding for updated chunk text: {chunk_data.text[:50]}...")
-            embedding = cohere_client.get_embedding(chunk_data.text)
+            embedding = self.embedding_cache.get_embedding(chunk_data.text, settings.COHERE_INPUT_TYPE, remember=False)
             if not embedding:
                 logger.error("Failed to generate embedding for chunk")
                 raise ValueError("Failed to generate embedding for chunk")
@@ -184,6 +192,9 @@ class ChunkService:
             if not chunk:
                 logger.error(f"Failed to update chunk: {chunk_id}")
                 return None
+            embedding_changed = chunk_data.embedding and chunk_data.embedding != existing_chunk.embedding
+            self.indexing_service.update_chunk(library_id, chunk_id, chunk_data.embedding if embedding_changed else None,
+                                               chunk.metadata)
             logger.info(f"Chunk updated successfully: {chunk_id}")
             return chunk
     
@@ -217,8 +228,30 @@ class ChunkService:
             success = self.repository.delete_chunk(library_id, document_id, chunk_id)
             if success:
                 logger.info(f"Chunk deleted successfully: {chunk_id}")
+                self.indexing_service.remove_chunk(library_id, chunk_id)
+                self.schedule_compaction(library_id)
             else:
                 logger.error(f"Failed to delete chunk: {chunk_id}")
             
             return success
+    
+    def schedule_compaction(self, library_id: str):
+        """
+        Start a background compaction once enough of the library's vectors are tombstoned.
+        """
+        if self.repository.needs_compaction(library_id):
+            threading.Thread(target=self.compact_vectors, args=(library_id,), daemon=True).start()
+    
+    def compact_vectors(self, library_id: str) -> int:
+        """
+        Reclaim tombstoned vectors; runs in a background thread after deletes.
+        """
+        try:
+            with lock_manager.get_lock(library_id):
+                if not self.repository.needs_compaction(library_id):
+                    return 0
+                return self.repository.compact_vectors(library_id)
+        except Exception as e:
+            logger.error(f"Vector compaction failed for library {library_id}: {str(e)}")
+            return 0
         
\ No newline at end of file
@@ -1,13 +1,20 @@
 from typing import List, Optional
-from app.repositories.document_repository import DocumentRepository
-from app.repositories.library_repository import LibraryRepository
+from app.repositories.document_repository import document_repository
+from app.repositories.library_repository import library_repository
+from app.repositories.chunk_repository import chunk_repository
+from app.services.indexing_service import IndexingService
+from app.services.chunk_service import ChunkService
+from app.utils.locking import lock_manager
 from app.models.models import Document, DocumentCreate
 from app.core.logger import logger
 
 class DocumentService:
     def __init__(self):
-        self.repository = DocumentRepository()
-        self.library_repository = LibraryRepository()
+        self.repository = document_repository
+        self.library_repository = library_repository
+        self.chunk_repository = chunk_repository
+        self.indexing_service = IndexingService()
+        self.chunk_service = ChunkService()
     
     def create_document(self, library_id: str, document_data: DocumentCreate) -> Optional[Document]:
         logger.info(f"Creating document in library: {library_id}")
@@ -120,11 +127,16 @@ class DocumentService:
             logger.warning(f"Document not found: {document_id}")
             return False
         
-        success = self.repository.delete_document(library_id, document_id)
-        if success:
+        # Under the library lock, so a chunk added to the document meanwhile can't miss the index removals
+        with lock_manager.get_lock(library_id):
+            chunk_ids = self.chunk_repository.delete_document_chunks(library_id, document_id)
+            if chunk_ids is None:
+                logger.error(f"Failed to delete document: {document_id}")
+                return False
+            # The document's chunks went with it, so drop them from built indexes too
+            for chunk_id in chunk_ids:
+                self.indexing_service.remove_chunk(library_id, chunk_id)
+            self.chunk_service.schedule_compaction(library_id)
             logger.info(f"Document deleted successfully: {document_id}")
-        else:
-            logger.error(f"Failed to delete document: {document_id}")
-        
-        return success
+            return True
     
\ No newline at end of file
@@ -1,14 +1,26 @@
-from typing import Optional, Dict, Any
-from app.repositories.chunk_repository import ChunkRepository
-from app.repositories.library_repository import LibraryRepository
+from typing import Callable, List, Optional, Dict, Any
+from app.repositories.chunk_repository import chunk_repository
+from app.repositories.library_repository import library_repository
 from app.utils.locking import lock_manager
+from app.utils.index_cache import index_cache, load_index
+from app.utils.index_flusher import index_flusher
+from app.utils.metadata_cache import metadata_cache
+from app.utils.result_cache import result_cache
+from app.indexing.metadata_table import MetadataTable
+from app.indexing.base_index import BaseIndex
+from app.indexing.index_storage import get_index_path
 from app.core.logger import logger
+from app.core.config import settings
 import numpy as np
 
 class IndexingService:  
+    INDEX_TYPES = ("HNSW", "FLAT")
+    # Index types that chunk writes update in place; the others pick up changes on the next build
+    INCREMENTAL_INDEX_TYPES = ("HNSW",)
+    
     def __init__(self):
-        self.repository = ChunkRepository()
-        self.library_repository = LibraryRepository()
+        self.repository = chunk_repository
+        self.library_repository = library_repository
     
     def build_index(self, library_id: str, index_type: str = "HNSW", 
                    parameters: Optional[Dict[str, Any]] = None) -> bool:
@@ -23,19 +35,19 @@ class IndexingService:
             logger.error(f"Library not found: {library_id}")
             raise ValueError(f"Library not found: {library_id}")
         
-        # Get all chunks and vectors for library
-        chunks, vectors = self.repository.get_all_vectors(library_id)
-        if len(chunks) == 0 or len(vectors) == 0:
-            logger.error(f"No vectors found for library: {library_id}")
-            raise ValueError(f"No vectors found for library: {library_id}")
-        
         # Acquire lock for the library to prevent concurrent writes
         with lock_manager.get_lock(library_id):
+            # Read vectors under the lock so no chunk write lands between the snapshot and the new index
+            chunk_ids, vectors = self.repository.get_all_vectors(library_id)
+            if len(chunk_ids) == 0 or len(vectors) == 0:
+                logger.error(f"No vectors found for library: {library_id}")
+                raise ValueError(f"No vectors found for library: {library_id}")
+            
             if index_type == "HNSW":
                 # Avoid circular imports
                 from app.indexing.hnsw_index import HNSWIndex
                 index = HNSWIndex()
-                success = index.build_index(vectors, parameters or {})
+                success = index.build_index(vectors, {'num_workers': settings.HNSW_BUILD_WORKERS, **(parameters or {})})
             elif index_type == "FLAT":
                 from app.indexing.flat_index import FlatIndex
                 index = FlatIndex()
@@ -47,10 +59,15 @@ class IndexingService:
             if not success:
                 logger.error(f"Failed to build {index_type} index for library: {library_id}")
                 return False
+            index.ids = list(chunk_ids)
             
-            # Save index to disk
-            index_path = f"data/index_{library_id}_{index_type}.pkl"
+            # Save index to disk, dropping any unsaved incremental changes to the old one
+            index_flusher.discard(library_id, index_type)
+            index_path = get_index_path(library_id, index_type)
             index.save_index(index_path)
+            # Replace any cached copy so searches pick up the new index without reloading it
+            index_cache.put(library_id, index_type, index)
+            result_cache.bump(library_id)
             
             logger.info(f"{index_type} index built successfully for library: {library_id}")
             return True
@@ -65,23 +82,83 @@ class IndexingService:
         if not library:
             logger.error(f"Library not found: {library_id}")
             raise ValueError(f"Library not found: {library_id}")
-        index_path = f"data/index_{library_id}_{index_type}.pkl"
-        
-        if index_type == "HNSW":
-            from app.indexing.hnsw_index import HNSWIndex
-            index = HNSWIndex()
-        elif index_type == "FLAT":
-            from app.indexing.flat_index import FlatIndex
-            index = FlatIndex()
-        else:
+        if index_type not in ("HNSW", "FLAT"):
             logger.error(f"Unsupported index type: {index_type}")
             raise ValueError(f"Unsupported index type: {index_type}")
-
-        if not index.load_index(index_path):
+        
+        index = load_index(library_id, index_type)
+        if index is None:
             logger.warning(f"Index not found for library: {library_id}, type: {index_type}")
             return None
         
         info = index.get_index_info()
         logger.info(f"Index info retrieved for library: {library_id}")
         return info
-    
\ No newline at end of file
+    
+    def add_chunk(self, library_id: str, chunk_id: str, embedding: List[float], metadata: Any = None):
+        def apply(index: BaseIndex, table: Optional[MetadataTable], incremental: bool) -> bool:
+            if not incremental:
+                return False
+            [position] = index.add_items(np.asarray([embedding]), [chunk_id])
+            if table is not None:
+                table.set_row(position, chunk_id, metadata)
+            return True
+        self._apply_chunk_write(library_id, f"add chunk {chunk_id}", apply)
+    
+    def update_chunk(self, library_id: str, chunk_id: str, embedding: Optional[List[float]], metadata: Any = None):
+        """
+        Apply an updated chunk; embedding is None when only the metadata changed.
+        """
+        def apply(index: BaseIndex, table: Optional[MetadataTable], incremental: bool) -> bool:
+            if embedding is None or not incremental:
+                if table is not None:
+                    table.update(chunk_id, metadata)
+                return False
+            position = index.update_item(chunk_id, np.asarray(embedding))
+            if table is not None:
+                table.set_row(position, chunk_id, metadata)
+            return True
+        self._apply_chunk_write(library_id, f"update chunk {chunk_id}", apply)
+    
+    def remove_chunk(self, library_id: str, chunk_id: str):
+        def apply(index: BaseIndex, table: Optional[MetadataTable], incremental: bool) -> bool:
+            if table is not None:
+                table.remove(chunk_id)
+            return incremental and index.mark_deleted(chunk_id)
+        self._apply_chunk_write(library_id, f"remove chunk {chunk_id}", apply)
+    
+    def _apply_chunk_write(self, library_id: str, description: str,
+                           apply: Callable[[BaseIndex, Optional[MetadataTable], bool], bool]):
+        """
+        Apply a chunk write to the library's loaded indexes and their metadata tables in place.
+        apply gets whether the index takes vector writes and returns whether the index itself changed, in which case it is scheduled to be saved.
+        A failed update drops the in-memory copy so searches fall back to the last saved index.
+        Every chunk write goes through here, so it also invalidates the library's cached search results.
+        """
+        with lock_manager.get_lock(library_id):
+            for index_type in self.INDEX_TYPES:
+                incremental = index_type in self.INCREMENTAL_INDEX_TYPES
+                if incremental:
+                    index = load_index(library_id, index_type)
+                else:
+                    # Other indexes only need their metadata table kept current, which exists only once loaded
+                    index = index_flusher.get_pending(library_id, index_type) or index_cache.get(library_id, index_type)
+                if index is None:
+                    continue
+                if index.ids is None:
+                    logger.warning(f"{index_type} index for library {library_id} predates chunk id mapping; rebuild it to apply chunk writes")
+                    metadata_cache.invalidate(index)
+                    continue
+                try:
+                    changed = apply(index, metadata_cache.get(index), incremental)
+                except Exception as e:
+                    logger.error(f"Failed to {description} in {index_type} index for library {library_id}: {str(e)}")
+                    index_flusher.discard(library_id, index_type)
+                    index_cache.invalidate(library_id, index_type)
+                    metadata_cache.invalidate(index)
+                    continue
+                if changed:
+                    index_flusher.mark_dirty(library_id, index_type, index)
+                    logger.info(f"Applied {description} to {index_type} index for library: {library_id}")
+            # Bumped last, so a search that started before the write finished can't cache what it saw
+            result_cache.bump(library_id)
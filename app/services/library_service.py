@@ -1,11 +1,14 @@
 from typing import List, Optional
-from app.repositories.library_repository import LibraryRepository
+from app.repositories.library_repository import library_repository
 from app.models.models import Library, LibraryCreate
+from app.utils.index_cache import index_cache
+from app.utils.index_flusher import index_flusher
+from app.utils.result_cache import result_cache
 from app.core.logger import logger
 
 class LibraryService:
     def __init__(self):
-        self.repository = LibraryRepository()
+        self.repository = library_repository
     
     def create_library(self, library_data: LibraryCreate) -> Library:
         logger.info(f"Creating library: {library_data.name}")
@@ -65,6 +68,9 @@ class LibraryService:
         
         success = self.repository.delete_library(library_id)
         if success:
+            index_flusher.discard(library_id)
+            index_cache.invalidate(library_id)
+            result_cache.bump(library_id)
             logger.info(f"Library deleted successfully: {library_id}")
         else:
             logger.error(f"Failed to delete library: {library_id}")
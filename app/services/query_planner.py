@@ -0,0 +1,50 @@
+import math
+import numpy as np
+from typing import Dict, Any, Optional
+from app.indexing.base_index import BaseIndex
+from app.models.models import QueryPlan
+from app.core.logger import logger
+
+class QueryPlanner:
+    """
+    Chooses how a filtered search runs from the filter's selectivity and estimated per-strategy costs.
+    Costs are in units of one row of a vectorized distance scan.
+    """
+    STRATEGIES = ('unfiltered', 'exact_subset', 'filtered_ann', 'post_filter')
+    # Post-filtering fetches k / selectivity candidates times this margin to absorb variance in the match rate
+    OVERFETCH_MARGIN = 1.5
+    # Below this selectivity the over-fetch needed for post-filtering grows too fast to be reliable
+    MIN_POST_FILTER_SELECTIVITY = 0.3
+    
+    def plan(self, index: BaseIndex, candidate_count: int, search_params: Dict[str, Any],
+             allowed: Optional[np.ndarray]) -> QueryPlan:
+        vector_count = len(index.vectors)
+        if allowed is None:
+            return QueryPlan(strategy='unfiltered', vector_count=vector_count, candidate_count=candidate_count)
+        
+        allowed_count = int(allowed.sum())
+        selectivity = allowed_count / vector_count if vector_count else 0.0
+        costs = {'exact_subset': float(allowed_count)}
+        # An exact request can't take an approximate plan, and the subset scan is never slower than a masked full scan
+        if not search_params.get('exact') and allowed_count > 0:
+            costs['filtered_ann'] = index.SEARCH_DISTANCE_COST * index.estimate_search_distances(
+                candidate_count, search_params, selectivity)
+            if selectivity >= self.MIN_POST_FILTER_SELECTIVITY:
+                fetch_count = math.ceil(candidate_count / selectivity * self.OVERFETCH_MARGIN)
+                costs['post_filter'] = index.SEARCH_DISTANCE_COST * index.estimate_search_distances(
+                    fetch_count, search_params)
+        
+        # Ties go to the earlier strategy, so an exact plan wins over an approximate one at equal cost
+        strategy = min(costs, key=lambda name: (costs[name], self.STRATEGIES.index(name)))
+        if strategy == 'post_filter':
+            candidate_count = math.ceil(candidate_count / selectivity * self.OVERFETCH_MARGIN)
+        plan = QueryPlan(
+            strategy=strategy,
+            vector_count=vector_count,
+            candidate_count=candidate_count,
+            allowed_count=allowed_count,
+            selectivity=selectivity,
+            estimated_costs=costs
+        )
+        logger.debug(f"Query plan: {plan.strategy} (selectivity {selectivity:.4f}, costs {costs})")
+        return plan
@@ -1,94 +1,265 @@
-from typing import List, Optional, Dict, Any
-from app.repositories.chunk_repository import ChunkRepository
-from app.repositories.library_repository import LibraryRepository
-from app.models.models import Chunk, SearchRequest, SearchResult
+import numpy as np
+from typing import List, Optional, Dict, Any, Tuple
+from app.repositories.chunk_repository import chunk_repository
+from app.repositories.library_repository import library_repository
+from app.models.models import ChunkMetadata, SearchRequest, BatchSearchRequest, SearchResult, QueryPlan
+from app.services.query_planner import QueryPlanner
+from app.indexing.base_index import BaseIndex
+from app.utils.index_cache import load_index
+from app.utils.metadata_cache import metadata_cache
+from app.utils.result_cache import result_cache
+from app.utils.embedding_cache import embedding_cache
+from app.utils.locking import lock_manager
+from app.indexing.metadata_table import MetadataTable, metadata_to_dict
 from app.core.logger import logger
+from app.core.config import settings
 
 class QueryService:
     def __init__(self):
-        self.repository = ChunkRepository()
-        self.library_repository = LibraryRepository()
+        self.repository = chunk_repository
+        self.library_repository = library_repository
+        self.planner = QueryPlanner()
+        self.embedding_cache = embedding_cache
     
     def search(self, library_id: str, search_request: SearchRequest, 
                index_type: str = "HNSW") -> List[SearchResult]:
+        return self.search_with_plan(library_id, search_request, index_type)[0]
+    
+    def search_with_plan(self, library_id: str, search_request: SearchRequest,
+                         index_type: str = "HNSW") -> Tuple[List[SearchResult], QueryPlan]:
         logger.info(f"Performing search in library: {library_id}")
         if not library_id or not library_id.strip():
             logger.error("Library ID cannot be empty")
             raise ValueError("Library ID cannot be empty")
         
-        if not search_request.query_embedding:
-            logger.error("Query embedding cannot be empty")
-            raise ValueError("Query embedding cannot be empty")
+        if search_request.query_embedding and search_request.query_text:
+            logger.error("Only one of query_embedding and query_text can be given")
+            raise ValueError("Only one of query_embedding and query_text can be given")
+        
+        if not search_request.query_embedding and not (search_request.query_text and search_request.query_text.strip()):
+            logger.error("Query embedding or query text is required")
+            raise ValueError("Query embedding or query text is required")
         
         if search_request.k <= 0:
             logger.error("K must be greater than 0")
             raise ValueError("K must be greater than 0")
         
+        search_params = self._get_search_params(search_request)
+        candidate_count = search_request.max_candidates or search_request.k
+        
         library = self.library_repository.get_library(library_id)
         if not library:
             logger.error(f"Library not found: {library_id}")
             raise ValueError(f"Library not found: {library_id}")
         
-        index_path = f"data/index_{library_id}_{index_type}.pkl"
-        if index_type == "HNSW":
-            from app.indexing.hnsw_index import HNSWIndex
-            index = HNSWIndex()
-        elif index_type == "FLAT":
-            from app.indexing.flat_index import FlatIndex
-            index = FlatIndex()
-        else:
-            logger.error(f"Unsupported index type: {index_type}")
-            raise ValueError(f"Unsupported index type: {index_type}")
+        query_embedding = search_request.query_embedding or self._embed_query(search_request.query_text)
+        cache_key = None
+        if result_cache.enabled:
+            cache_key = result_cache.make_key(library_id, index_type, query_embedding, search_request.k,
+                                              search_request.metadata_filter,
+                                              {**search_params, 'max_candidates': search_request.max_candidates})
+            # Read before searching, so a write that lands mid-search keeps these results out of the cache
+            generation = result_cache.generation(library_id)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                results, plan = cached
+                logger.info(f"Search served {len(results)} cached results for library: {library_id}")
+                return list(results), plan.model_copy(update={'cached': True})
+        
+        index = self._load_index(library_id, index_type)
+        allowed = None
+        if search_request.metadata_filter:
+            allowed = self._get_allowed_mask(library_id, index, search_request.metadata_filter)
+        plan = self.planner.plan(index, candidate_count, search_params, allowed)
 
-        # Try to load the index
-        if not index.load_index(index_path):
+        # Perform search
+        [results] = self._execute_plan(library_id, index, [query_embedding], plan, search_params,
+                                       allowed, search_request.metadata_filter, search_request.k)
+        plan.search_stats = index.get_last_search_stats()
+        logger.info(f"Search completed with {len(results)} results using plan {plan.strategy}")
+        if plan.search_stats:
+            logger.info(f"Search stats: {plan.search_stats}")
+        if cache_key is not None:
+            result_cache.put(cache_key, library_id, generation, (results, plan), self._estimate_results_bytes(results))
+        return list(results), plan
+    
+    def search_batch(self, library_id: str, batch_request: BatchSearchRequest,
+                     index_type: str = "HNSW") -> List[List[SearchResult]]:
+        logger.info(f"Performing batch search of {len(batch_request.query_embeddings)} queries in library: {library_id}")
+        if not library_id or not library_id.strip():
+            logger.error("Library ID cannot be empty")
+            raise ValueError("Library ID cannot be empty")
+        
+        if not batch_request.query_embeddings or any(not q for q in batch_request.query_embeddings):
+            logger.error("Query embeddings cannot be empty")
+            raise ValueError("Query embeddings cannot be empty")
+        
+        if len({len(q) for q in batch_request.query_embeddings}) != 1:
+            logger.error("Query embeddings must all have the same dimension")
+            raise ValueError("Query embeddings must all have the same dimension")
+        
+        search_params = self._get_search_params(batch_request)
+        candidate_count = batch_request.max_candidates or batch_request.k
+        
+        library = self.library_repository.get_library(library_id)
+        if not library:
+            logger.error(f"Library not found: {library_id}")
+            raise ValueError(f"Library not found: {library_id}")
+        
+        # The index is loaded once and shared by every query in the batch
+        index = self._load_index(library_id, index_type)
+        allowed = None
+        if batch_request.metadata_filter:
+            allowed = self._get_allowed_mask(library_id, index, batch_request.metadata_filter)
+        # Every query shares the filter, so one plan serves the whole batch
+        plan = self.planner.plan(index, candidate_count, search_params, allowed)
+        
+        results = self._execute_plan(library_id, index, batch_request.query_embeddings, plan, search_params,
+                                     allowed, batch_request.metadata_filter, batch_request.k)
+        logger.info(f"Batch search completed for {len(results)} queries using plan {plan.strategy}")
+        return results
+    
+    def _execute_plan(self, library_id: str, index: BaseIndex, queries: List[List[float]], plan: QueryPlan,
+                      search_params: Dict[str, Any], allowed: Optional[np.ndarray],
+                      metadata_filter: Optional[Dict[str, Any]], k: int) -> List[List[SearchResult]]:
+        if plan.strategy == 'exact_subset':
+            hits = index.search_subset(queries, np.flatnonzero(allowed), plan.candidate_count)
+        elif plan.strategy == 'filtered_ann':
+            hits = index.search_batch(queries, plan.candidate_count, {**search_params, 'allowed': allowed})
+        else:
+            # Unfiltered, or over-fetched candidates that the allow-list thins out below
+            hits = index.search_batch(queries, plan.candidate_count, search_params)
+        if allowed is not None:
+            # The mask is exact, so non-matches are dropped before hydrating rather than by checking loaded chunks
+            hits = self._keep_allowed(hits, allowed, k)
+            metadata_filter = None
+        results = self._build_results(library_id, index, hits, metadata_filter, k)
+        
+        if plan.strategy == 'post_filter':
+            # The over-fetch can still come up short when matches cluster away from the query
+            short = [n for n, query_results in enumerate(results) if len(query_results) < min(k, plan.allowed_count)]
+            if short:
+                plan.fallback = 'filtered_ann'
+                retry_hits = index.search_batch([queries[n] for n in short], k, {**search_params, 'allowed': allowed})
+                retry_hits = self._keep_allowed(retry_hits, allowed, k)
+                for n, query_results in zip(short, self._build_results(library_id, index, retry_hits, None, k)):
+                    results[n] = query_results
+        return results
+    
+    @staticmethod
+    def _keep_allowed(hits: List[Tuple[List[int], List[float]]], allowed: np.ndarray,
+                      k: int) -> List[Tuple[List[int], List[float]]]:
+        """
+        Each query's hits with positions outside the allow-list removed, cut to the k nearest.
+        """
+        kept = []
+        for indices, scores in hits:
+            pairs = [(idx, score) for idx, score in zip(indices, scores) if idx < len(allowed) and allowed[idx]][:k]
+            kept.append(([idx for idx, _ in pairs], [score for _, score in pairs]))
+        return kept
+    
+    def _embed_query(self, query_text: str) -> List[float]:
+        embedding = self.embedding_cache.get_embedding(query_text, settings.COHERE_QUERY_INPUT_TYPE)
+        if not embedding:
+            logger.error("Failed to generate embedding for query text")
+            raise ValueError("Failed to generate embedding for query text")
+        return embedding
+    
+    @staticmethod
+    def _estimate_results_bytes(results: List[SearchResult]) -> int:
+        # Text and embedding dominate; the rest of a result is a few hundred bytes of Python objects
+        return sum(256 + len(result.chunk.text) + 32 * len(result.chunk.embedding or []) for result in results)
+    
+    def _get_search_params(self, request) -> Dict[str, Any]:
+        """
+        Validate a request's search knobs and collect the ones that were set for index.search.
+        max_candidates is how many neighbors to fetch before metadata filtering trims the results to k.
+        """
+        if request.ef_search is not None and request.ef_search <= 0:
+            logger.error("ef_search must be greater than 0")
+            raise ValueError("ef_search must be greater than 0")
+        
+        if request.max_candidates is not None and request.max_candidates < request.k:
+            logger.error(f"max_candidates must be at least k ({request.k})")
+            raise ValueError(f"max_candidates must be at least k ({request.k})")
+        
+        search_params = {'exact': request.exact}
+        if request.ef_search is not None:
+            search_params['ef_search'] = request.ef_search
+        return search_params
+    
+    def _load_index(self, library_id: str, index_type: str) -> BaseIndex:
+        index = load_index(library_id, index_type)
+        if index is None:
             logger.error(f"Index not found for library: {library_id}, type: {index_type}")
             raise ValueError(f"Index not found for library: {library_id}")
-
-        # Log some internals for debugging (entry_point, levels, vectors shape)
-        try:
-            entry_point = getattr(index, 'entry_point', None)
-            levels = getattr(index, 'levels', None)
-            vectors_shape = None
-            if hasattr(index, 'vectors') and index.vectors is not None:
-                vectors_shape = getattr(index, 'vectors').shape
-            logger.info(f"Index internals - entry_point: {entry_point}, levels_len: {len(levels) if levels is not None else None}, vectors_shape: {vectors_shape}")
-        except Exception as e:
-            logger.debug(f"Could not inspect index internals: {e}")
-
-        # Perform search
-        indices, scores = index.search(search_request.query_embedding, search_request.k)
-        logger.info(f"Index returned indices: {indices}, scores: {scores}")
-
-        # Get chunks for the library
-        chunks, _ = self.repository.get_all_vectors(library_id)
+        return index
+    
+    def _position_ids(self, index: BaseIndex, library_id: str) -> List[str]:
+        if index.ids is not None:
+            return index.ids
+        # Indexes saved before chunk ids were stored follow chunk insertion order
+        return [chunk_id for chunk_id, _ in self.repository.get_indexed_metadata(library_id)]
+    
+    def _get_allowed_mask(self, library_id: str, index: BaseIndex, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        """
+        Allow-list over index positions of the chunks matching the filter, so the index
+        only returns matches instead of returning k neighbors for the filter to thin out.
+        """
+        allowed = self._get_metadata_table(library_id, index).evaluate(metadata_filter)
+        # The index may hold positions the table has no row for (legacy indexes with missing chunks)
+        return allowed[:len(index.vectors)]
+    
+    def _get_metadata_table(self, library_id: str, index: BaseIndex) -> MetadataTable:
+        table = metadata_cache.get(index)
+        if table is not None:
+            return table
+        # Built under the library lock so no chunk write lands between reading the chunks and registering the table
+        with lock_manager.get_lock(library_id):
+            table = metadata_cache.get(index)
+            if table is None:
+                # Parsed through ChunkMetadata so filters see the same values as on a loaded Chunk
+                metadata_by_id = {
+                    chunk_id: ChunkMetadata(**metadata)
+                    for chunk_id, metadata in self.repository.get_indexed_metadata(library_id)
+                }
+                ids = [chunk_id if chunk_id in metadata_by_id else None
+                       for chunk_id in self._position_ids(index, library_id)[:len(index.vectors)]]
+                table = MetadataTable(ids, [metadata_by_id.get(chunk_id) for chunk_id in ids])
+                metadata_cache.put(index, table)
+                logger.info(f"Built metadata table for library {library_id}: {table.get_stats()}")
+            return table
+    
+    def _build_results(self, library_id: str, index: BaseIndex, hits: List[Tuple[List[int], List[float]]],
+                       metadata_filter: Optional[Dict[str, Any]], k: int) -> List[List[SearchResult]]:
+        """
+        Map each query's hit positions to chunks, loading only the hit chunks with one id lookup for all queries.
+        """
+        position_ids = self._position_ids(index, library_id)
+        hit_ids = [position_ids[idx] for indices, _ in hits for idx in indices if idx < len(position_ids)]
+        chunks = self.repository.get_chunks_by_ids(library_id, hit_ids)
         
-        # Map indices to chunks and apply metadata filtering
         results = []
-        for i, (idx, score) in enumerate(zip(indices, scores)):
-            if idx < len(chunks):
-                chunk = chunks[idx]
-                if search_request.metadata_filter:
-                    if not self._matches_metadata_filter(chunk.metadata, search_request.metadata_filter):
+        for indices, scores in hits:
+            query_results = []
+            for idx, score in zip(indices, scores):
+                # Chunks deleted since the index was built have no row
+                chunk = chunks.get(position_ids[idx]) if idx < len(position_ids) else None
+                if chunk is None:
+                    continue
+                if metadata_filter:
+                    if not self._matches_metadata_filter(chunk.metadata, metadata_filter):
                         continue
-
-                results.append(SearchResult(chunk=chunk, score=score))
-        
-        logger.info(f"Search completed with {len(results)} results")
+                query_results.append(SearchResult(chunk=chunk, score=score))
+                if len(query_results) == k:
+                    break
+            results.append(query_results)
         return results
     
     def _matches_metadata_filter(self, chunk_metadata: Dict[str, Any], 
                                 metadata_filter: Dict[str, Any]) -> bool:
         # Ensure chunk_metadata is a plain dict
-        try:
-            if not isinstance(chunk_metadata, dict) and hasattr(chunk_metadata, 'model_dump'):
-                chunk_metadata = chunk_metadata.model_dump()
-        except Exception:
-            # Fall back to attempting to convert via __dict__
-            try:
-                chunk_metadata = dict(getattr(chunk_metadata, '__dict__', {}) or {})
-            except Exception:
-                chunk_metadata = {}
+        chunk_metadata = metadata_to_dict(chunk_metadata)
 
         for key, filter_value in metadata_filter.items():
             # Check if key exists in chunk metadata
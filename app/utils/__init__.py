@@ -1,4 +1,13 @@
 from app.utils.locking import LockManager, lock_manager
 from app.utils.cohere_client import CohereClient, cohere_client
+from app.utils.index_cache import IndexCache, index_cache, load_index
+from app.utils.index_flusher import IndexFlusher, index_flusher
+from app.utils.metadata_cache import MetadataCache, metadata_cache
+from app.utils.result_cache import ResultCache, result_cache
+from app.utils.embedding_batcher import EmbeddingBatcher, embedding_batcher
+from app.utils.embedding_cache import EmbeddingCache, EmbeddingProvider, embedding_cache
 
-__all__ = ["LockManager", "lock_manager", "CohereClient", "cohere_client"]
+__all__ = ["LockManager", "lock_manager", "CohereClient", "cohere_client", "IndexCache", "index_cache", "load_index",
+           "IndexFlusher", "index_flusher", "MetadataCache", "metadata_cache",
+           "ResultCache", "result_cache", "EmbeddingCache", "EmbeddingProvider", "embedding_cache",
+           "EmbeddingBatcher", "embedding_batcher"]
@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.utils.cohere_client import CohereClient, cohere_client
+from app.core.config import settings
+from app.core.logger import logger
+
+class EmbeddingBatcher:
+    """
+    Coalesces single-text embedding requests from concurrent callers into batched embed calls.
+    Requests are queued per (model, input_type); a queue is sent as one get_embeddings_batch call
+    once it holds max_batch_size texts or its oldest request has waited window_seconds. Each caller
+    blocks on a future for its own vector, so this is a drop-in get_embedding provider.
+    """
+    # Cohere's embed endpoint takes at most this many texts per call
+    PROVIDER_MAX_BATCH_SIZE = 96
+    
+    def __init__(self, client: CohereClient, max_batch_size: int, window_seconds: float, max_concurrency: int):
+        self.client = client
+        self.max_batch_size = min(max_batch_size, self.PROVIDER_MAX_BATCH_SIZE)
+        self.window_seconds = window_seconds
+        self.max_concurrency = max_concurrency
+        # (model, input_type) -> (time the oldest request was queued, [(text, future)])
+        self._pending: Dict[Tuple[str, str], Tuple[float, List[Tuple[str, Future]]]] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.requests = 0
+        self.batches = 0
+        self.texts_sent = 0
+    
+    def submit(self, text: str, model: Optional[str] = None, input_type: Optional[str] = None) -> Future:
+        key = (model or settings.COHERE_MODEL, input_type or settings.COHERE_INPUT_TYPE)
+        future: Future = Future()
+        with self._condition:
+            _, queue = self._pending.setdefault(key, (time.monotonic(), []))
+            queue.append((text, future))
+            self.requests += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding-batch")
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+    
+    def get_embedding(self, text: str, model: Optional[str] = None,
+                      input_type: Optional[str] = None) -> Optional[List[float]]:
+        """
+        Same contract as CohereClient.get_embedding: the vector, or None if the embed call failed.
+        """
+        return self.submit(text, model, input_type).result()
+    
+    def stop(self):
+        """
+        Send everything still queued, then stop the dispatcher thread.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+    
+    def get_stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'texts_sent': self.texts_sent,
+                'queued': sum(len(queue) for _, queue in self._pending.values()),
+                'max_batch_size': self.max_batch_size,
+                'window_ms': self.window_seconds * 1000
+            }
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                key = self._next_ready()
+                while key is None and not (self._stopped and not self._pending):
+                    self._condition.wait(self._time_to_next_deadline())
+                    key = self._next_ready()
+                if key is None:
+                    return
+                started, queue = self._pending.pop(key)
+                batch, rest = queue[:self.max_batch_size], queue[self.max_batch_size:]
+                if rest:
+                    self._pending[key] = (started, rest)
+                self.batches += 1
+                executor = self._executor
+            executor.submit(self._dispatch, key, batch)
+    
+    def _next_ready(self) -> Optional[Tuple[str, str]]:
+        # Called with the condition held: a full queue goes first, then the oldest expired one
+        now = time.monotonic()
+        expired = None
+        for key, (started, queue) in self._pending.items():
+            if len(queue) >= self.max_batch_size:
+                return key
+            if expired is None and (self._stopped or now - started >= self.window_seconds):
+                expired = key
+        return expired
+    
+    def _time_to_next_deadline(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        oldest = min(started for started, _ in self._pending.values())
+        return max(oldest + self.window_seconds - time.monotonic(), 0.0)
+    
+    def _dispatch(self, key: Tuple[str, str], batch: List[Tuple[str, Future]]):
+        model, input_type = key
+        # Identical texts in one batch are embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = self.client.get_embeddings_batch(texts, model=model, input_type=input_type)
+        except Exception as e:
+            logger.error(f"Batched embedding call failed: {str(e)}")
+            embeddings = None
+        if embeddings is None or len(embeddings) != len(texts):
+            logger.error(f"Failed to embed a batch of {len(texts)} texts")
+            embeddings = [None] * len(texts)
+        with self._condition:
+            self.texts_sent += len(texts)
+        logger.debug(f"Embedded {len(texts)} texts for {len(batch)} requests in one call")
+        by_text = dict(zip(texts, embeddings))
+        for text, future in batch:
+            future.set_result(by_text[text])
+
+embedding_batcher = EmbeddingBatcher(cohere_client, settings.EMBEDDING_BATCH_MAX_SIZE,
+                                     settings.EMBEDDING_BATCH_WINDOW_MS / 1000, settings.EMBEDDING_BATCH_MAX_CONCURRENCY)
@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+from app.repositories.embedding_cache_repository import EmbeddingCacheRepository, embedding_cache_repository
+from app.utils.embedding_batcher import embedding_batcher
+from app.core.config import settings
+from app.core.logger import logger
+
+class EmbeddingProvider(Protocol):
+    """
+    Anything that embeds one text, such as CohereClient; swap in a local one for offline tests.
+    """
+    def get_embedding(self, text: str, model: Optional[str] = None,
+                      input_type: Optional[str] = None) -> Optional[List[float]]:
+        ...
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (model, input_type, SHA-256 of the text): a bounded in-memory LRU in
+    front of the persistent embedding_cache table, so a text is sent to the provider once.
+    """
+    def __init__(self, provider: EmbeddingProvider, max_entries: int,
+                 repository: EmbeddingCacheRepository = embedding_cache_repository):
+        self.provider = provider
+        self.max_entries = max_entries
+        self.repository = repository
+        self._entries: "OrderedDict[Tuple[str, str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        # The same counters per input type, so ingestion and query traffic are reported separately
+        self._counters_by_input_type: Dict[str, Dict[str, int]] = {}
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def get_embedding(self, text: str, input_type: str, model: Optional[str] = None,
+                      remember: bool = True) -> Optional[List[float]]:
+        """
+        Embedding of text from the memory or persistent cache, calling the provider only on a miss.
+        remember=False keeps the result out of the in-memory LRU, for one-off texts that would evict hot ones.
+        Returns None if the provider fails.
+        """
+        model = model or settings.COHERE_MODEL
+        key = (model, input_type, self.text_hash(text))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self._count(input_type, 'hits')
+                return embedding
+        
+        embedding = self._load(key)
+        if embedding is not None:
+            with self._lock:
+                self._count(input_type, 'persistent_hits')
+        else:
+            with self._lock:
+                self._count(input_type, 'misses')
+            embedding = self.provider.get_embedding(text, model=model, input_type=input_type)
+            if not embedding:
+                return None
+            self._store(key, embedding)
+        if remember:
+            self._remember(key, embedding)
+        return embedding
+    
+    def clear(self):
+        """
+        Drop the in-memory entries; the persistent table is left alone.
+        """
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'by_input_type': {input_type: dict(counters) for input_type, counters in self._counters_by_input_type.items()}
+            }
+    
+    def _count(self, input_type: str, counter: str):
+        # Called with the lock held
+        setattr(self, counter, getattr(self, counter) + 1)
+        counters = self._counters_by_input_type.setdefault(input_type, {'hits': 0, 'persistent_hits': 0, 'misses': 0})
+        counters[counter] += 1
+    
+    def _load(self, key: Tuple[str, str, str]) -> Optional[List[float]]:
+        # The table is only a cache, so a database error degrades to calling the provider
+        try:
+            return self.repository.get_embedding(*key)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read embedding cache: {str(e)}")
+            return None
+    
+    def _store(self, key: Tuple[str, str, str], embedding: List[float]):
+        try:
+            self.repository.put_embedding(*key, embedding)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write embedding cache: {str(e)}")
+    
+    def _remember(self, key: Tuple[str, str, str], embedding: List[float]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Misses go through the batcher, so concurrent uncached texts share embed calls
+embedding_cache = EmbeddingCache(embedding_batcher, settings.EMBEDDING_CACHE_MAX_ENTRIES)
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.indexing.base_index import BaseIndex
+from app.indexing.index_storage import get_index_path, get_legacy_index_path
+from app.utils.index_flusher import index_flusher
+from app.utils.locking import lock_manager
+from app.core.config import settings
+from app.core.logger import logger
+
+class IndexCache:
+    """
+    Process-wide LRU cache of loaded indexes keyed by (library_id, index_type),
+    bounded by an approximate memory budget in bytes.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[BaseIndex, int]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, library_id: str, index_type: str) -> Optional[BaseIndex]:
+        key = (library_id, index_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, library_id: str, index_type: str, index: BaseIndex):
+        key = (library_id, index_type)
+        size = index.estimate_memory_bytes()
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                logger.warning(f"Index for library {library_id} ({size} bytes) exceeds cache budget, not caching")
+                return
+            self._entries[key] = (index, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                evicted_key, _ = next(iter(self._entries.items()))
+                self._remove(evicted_key)
+                self.evictions += 1
+                logger.info(f"Evicted index from cache: {evicted_key}")
+    
+    def invalidate(self, library_id: str, index_type: Optional[str] = None):
+        with self._lock:
+            keys = [key for key in self._entries
+                    if key[0] == library_id and (index_type is None or key[1] == index_type)]
+            for key in keys:
+                self._remove(key)
+                logger.debug(f"Invalidated cached index: {key}")
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+    
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+index_cache = IndexCache(settings.INDEX_CACHE_MAX_BYTES)
+
+def load_index(library_id: str, index_type: str) -> Optional[BaseIndex]:
+    """
+    The library's current index: the copy with unsaved chunk writes, else the cached one,
+    else loaded from disk and cached. None if there is no index file or it fails to load.
+    """
+    # An index with unsaved chunk writes is newer than both the cache and the file
+    index = index_flusher.get_pending(library_id, index_type) or index_cache.get(library_id, index_type)
+    if index is not None:
+        return index
+    
+    if index_type == "HNSW":
+        # Avoid circular imports
+        from app.indexing.hnsw_index import HNSWIndex
+        index = HNSWIndex()
+    elif index_type == "FLAT":
+        from app.indexing.flat_index import FlatIndex
+        index = FlatIndex()
+    else:
+        logger.error(f"Unsupported index type: {index_type}")
+        raise ValueError(f"Unsupported index type: {index_type}")
+    
+    # Load under the library lock so a build or chunk write can't cache a newer index while
+    # this reads the old file, only to have the stale copy put over it
+    with lock_manager.get_lock(library_id):
+        current = index_flusher.get_pending(library_id, index_type) or index_cache.get(library_id, index_type)
+        if current is not None:
+            return current
+        index_path = get_index_path(library_id, index_type)
+        if not os.path.exists(index_path) and not os.path.exists(get_legacy_index_path(index_path)):
+            return None
+        if not index.load_index(index_path):
+            return None
+        logger.info(f"Loaded {index_type} index for library {library_id}: {index.get_index_info()}")
+        index_cache.put(library_id, index_type, index)
+        return index
@@ -0,0 +1,84 @@
+import threading
+from typing import Dict, Optional, Tuple
+from app.indexing.base_index import BaseIndex
+from app.indexing.index_storage import get_index_path
+from app.utils.locking import lock_manager
+from app.core.config import settings
+from app.core.logger import logger
+
+class IndexFlusher:
+    """
+    Writes incrementally updated indexes back to disk in the background.
+    Chunk writes only mark an index dirty; a daemon thread saves dirty indexes
+    every interval_seconds, and flush() saves them on demand (e.g. at shutdown).
+    """
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._dirty: Dict[Tuple[str, str], Tuple[BaseIndex, int]] = {}
+        # Bumped by discard() so a flush that raced with a rebuild or delete never writes the stale copy
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def mark_dirty(self, library_id: str, index_type: str, index: BaseIndex):
+        key = (library_id, index_type)
+        with self._lock:
+            self._dirty[key] = (index, self._generations.get(key, 0))
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="index-flusher", daemon=True)
+                self._thread.start()
+    
+    def get_pending(self, library_id: str, index_type: str) -> Optional[BaseIndex]:
+        """
+        The unsaved in-memory index for this key, which is newer than the file on disk.
+        """
+        with self._lock:
+            entry = self._dirty.get((library_id, index_type))
+            return entry[0] if entry else None
+    
+    def discard(self, library_id: str, index_type: Optional[str] = None):
+        with self._lock:
+            for key in [key for key in set(self._dirty) | set(self._generations) if key[0] == library_id]:
+                if index_type is None or key[1] == index_type:
+                    self._dirty.pop(key, None)
+                    self._generations[key] = self._generations.get(key, 0) + 1
+    
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._dirty = self._dirty, {}
+        saved = 0
+        for (library_id, index_type), (index, generation) in pending.items():
+            # Saving under the library lock keeps writers from mutating the index mid-save
+            with lock_manager.get_lock(library_id):
+                with self._lock:
+                    if self._generations.get((library_id, index_type), 0) != generation:
+                        continue
+                if index.save_index(get_index_path(library_id, index_type)):
+                    saved += 1
+                else:
+                    logger.error(f"Failed to persist {index_type} index for library {library_id}; will retry")
+                    with self._lock:
+                        self._dirty.setdefault((library_id, index_type), (index, generation))
+        if saved:
+            logger.info(f"Persisted {saved} incrementally updated indexes")
+        return saved
+    
+    def stop(self) -> int:
+        """
+        Stop the background thread and save everything still dirty.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_seconds + 5)
+        return self.flush()
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Background index flush failed: {str(e)}")
+
+index_flusher = IndexFlusher(settings.INDEX_FLUSH_INTERVAL_SECONDS)
@@ -0,0 +1,29 @@
+import threading
+import weakref
+from typing import Optional
+from app.indexing.base_index import BaseIndex
+from app.indexing.metadata_table import MetadataTable
+
+class MetadataCache:
+    """
+    Columnar metadata tables for loaded indexes, used to evaluate metadata filters.
+    Tables are weakly keyed by the index object, so a table goes away with its index
+    when the index is rebuilt or evicted from the index cache.
+    """
+    def __init__(self):
+        self._tables: "weakref.WeakKeyDictionary[BaseIndex, MetadataTable]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def get(self, index: BaseIndex) -> Optional[MetadataTable]:
+        with self._lock:
+            return self._tables.get(index)
+    
+    def put(self, index: BaseIndex, table: MetadataTable):
+        with self._lock:
+            self._tables[index] = table
+    
+    def invalidate(self, index: BaseIndex):
+        with self._lock:
+            self._tables.pop(index, None)
+
+metadata_cache = MetadataCache()
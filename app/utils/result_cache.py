@@ -0,0 +1,120 @@
+import hashlib
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+
+class ResultCache:
+    """
+    Process-wide LRU cache of search results, bounded by entry count and an approximate
+    memory budget in bytes. Every library has a write generation; an entry is only served
+    while its library is still at the generation it was computed under, so a chunk write or
+    index build invalidates the library's cached results without scanning the cache.
+    """
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> (library_id, generation, value, size)
+        self._entries: "OrderedDict[str, Tuple[str, int, Any, int]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+    
+    @staticmethod
+    def make_key(library_id: str, index_type: str, query_embedding: List[float], k: int,
+                 metadata_filter: Optional[Dict[str, Any]], search_params: Dict[str, Any]) -> str:
+        """
+        Hash of everything that decides a search's results. The query is quantized to float32,
+        the precision vectors are stored and searched at, and the filter is canonicalized so
+        key order doesn't matter.
+        """
+        digest = hashlib.sha256()
+        for part in (library_id, index_type, str(k),
+                     json.dumps(metadata_filter or {}, sort_keys=True, default=str),
+                     json.dumps(search_params, sort_keys=True, default=str)):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        digest.update(np.asarray(query_embedding, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+    
+    def generation(self, library_id: str) -> int:
+        with self._lock:
+            return self._generations.get(library_id, 0)
+    
+    def bump(self, library_id: str):
+        """
+        Record a write to the library, invalidating every result cached for it.
+        """
+        with self._lock:
+            self._generations[library_id] = self._generations.get(library_id, 0) + 1
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            library_id, generation, value, _ = entry
+            if generation != self._generations.get(library_id, 0):
+                self._remove(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: str, library_id: str, generation: int, value: Any, size: int):
+        """
+        Cache value computed under generation, which the caller reads before searching;
+        results computed across a concurrent write are dropped instead of cached.
+        """
+        with self._lock:
+            if generation != self._generations.get(library_id, 0):
+                return
+            self._remove(key)
+            if size > self.max_bytes:
+                logger.debug(f"Search result for library {library_id} ({size} bytes) exceeds result cache budget, not caching")
+                return
+            self._entries[key] = (library_id, generation, value, size)
+            self.current_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale': self.stale
+            }
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[3]
+
+result_cache = ResultCache(settings.RESULT_CACHE_MAX_ENTRIES, settings.RESULT_CACHE_MAX_BYTES)
@@ -0,0 +1,85 @@
+"""
+Times ChunkRepository.get_all_vectors against the previous implementation, which loaded
+every chunk with its embedding and then issued one SELECT vector_index per chunk.
+
+    python benchmarks/bench_get_all_vectors.py --chunks 20000 --dim 1024
+
+Runs against a throwaway database and data directory in a temp folder.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+
+
+def legacy_get_all_vectors(repository, library_id: str):
+    """The N+1 get_all_vectors from before this change, on top of today's storage."""
+    chunks = repository.get_chunks_by_library(library_id)
+    chunks_with_embeddings = [chunk for chunk in chunks if chunk.embedding is not None]
+    vector_indices = []
+    for chunk in chunks_with_embeddings:
+        result = repository.execute_query("SELECT vector_index FROM chunks WHERE id = ?", (chunk.id,))
+        if result and result[0]["vector_index"] >= 0:
+            vector_indices.append(result[0]["vector_index"])
+    return chunks_with_embeddings, repository._get_vector_store(library_id).take(vector_indices)
+
+
+def populate(repository, library_id: str, num_chunks: int, dim: int):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(num_chunks, dim)).astype(np.float32)
+    rows = repository._get_vector_store(library_id).append_many(list(vectors))
+    with repository.transaction() as conn:
+        conn.execute("INSERT INTO libraries (id, name, metadata) VALUES (?, ?, ?)", (library_id, "bench", "{}"))
+        conn.executemany(
+            "INSERT INTO chunks (id, library_id, text, embedding, metadata, vector_index) VALUES (?, ?, ?, ?, ?, ?)",
+            [(str(uuid.uuid4()), library_id, f"chunk {i}", vectors[i].tobytes(), json.dumps({"page": i}), row)
+             for i, row in enumerate(rows)]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_vectors_")
+    os.chdir(workdir)
+    settings.DATABASE_URL = f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+    from app.repositories.chunk_repository import chunk_repository as repository
+    from app.repositories.migrations import run_migrations
+
+    run_migrations()
+    library_id = str(uuid.uuid4())
+    populate(repository, library_id, args.chunks, args.dim)
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn(repository, library_id)
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    legacy_s, (legacy_chunks, legacy_vectors) = timed(legacy_get_all_vectors)
+    new_s, (chunk_ids, vectors) = timed(lambda repo, lib: repo.get_all_vectors(lib))
+
+    assert [chunk.id for chunk in legacy_chunks] == chunk_ids
+    assert np.array_equal(legacy_vectors, vectors)
+    print(f"chunks={args.chunks} dim={args.dim} (best of {args.repeat})")
+    print(f"  legacy N+1 get_all_vectors: {legacy_s * 1000:9.1f} ms")
+    print(f"  projected get_all_vectors:  {new_s * 1000:9.1f} ms  ({legacy_s / new_s:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures HNSWIndex build time as the number of build worker processes grows.
+
+Every build uses the same vectors and level assignment, and recall@k is
+measured at one fixed ef_search so speedups are compared at equal quality.
+Workers only parallelize the link searches; the building process still writes
+every link, so speedup is bounded by that serial share (about 20-30% of a
+one-worker build) and needs as many free cores as workers.
+
+    python benchmarks/bench_hnsw_build.py --vectors 20000 --dim 256 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.indexing.hnsw_index import HNSWIndex
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def recall(index: HNSWIndex, queries: np.ndarray, truth: np.ndarray, k: int) -> float:
+    hits = 0
+    for query, expected in zip(queries, truth):
+        indices, _ = index.search(query, k)
+        hits += len(set(indices) & set(expected.tolist()))
+    return hits / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.vectors, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    truth = exact_neighbors(vectors, queries, args.k)
+
+    print(f"N={args.vectors} d={args.dim} M={args.M} ef_construction={args.ef_construction} "
+          f"ef_search={args.ef_search} cpus={os.cpu_count()}")
+    print(f"{'workers':>8}{'build_s':>10}{'speedup':>9}{'recall@k':>10}")
+    baseline = None
+    for num_workers in sorted(set(args.workers)):
+        np.random.seed(0)  # HNSW level assignment
+        index = HNSWIndex()
+        start = time.perf_counter()
+        index.build_index(vectors, {"M": args.M, "ef_construction": args.ef_construction, "num_workers": num_workers})
+        build_s = time.perf_counter() - start
+        baseline = baseline or build_s
+        index.ef_search = args.ef_search
+        print(f"{num_workers:>8}{build_s:>10.1f}{baseline / build_s:>8.2f}x"
+              f"{recall(index, queries, truth, args.k):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures HNSWIndex search work, latency and recall@k against exact brute force.
+
+Reports mean distance computations per query as a fraction of N, which should
+shrink as the library grows if the beam search is sub-linear. Each build
+configuration gets its own recall-vs-latency table: "simple" is the previous
+construction (M nearest links, mL=1.0), "heuristic" the current default
+(diverse neighbor selection, M0=2*M, mL=1/ln(M)).
+
+    python benchmarks/bench_hnsw_search.py --vectors 10000 --dim 64 --ef-search 16 32 64 128
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.indexing.hnsw_index import HNSWIndex
+
+
+BUILDS = {
+    "simple": {"neighbor_selection": "simple", "mL": 1.0},
+    "heuristic": {"neighbor_selection": "heuristic"},
+}
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--builds", nargs="+", choices=sorted(BUILDS), default=["simple", "heuristic"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.vectors, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    truth = exact_neighbors(vectors, queries, args.k)
+
+    print(f"N={args.vectors} d={args.dim} k={args.k} M={args.M} ef_construction={args.ef_construction}")
+    for build in args.builds:
+        np.random.seed(0)  # HNSW level assignment
+        index = HNSWIndex()
+        start = time.perf_counter()
+        index.build_index(vectors, {"M": args.M, "ef_construction": args.ef_construction, **BUILDS[build]})
+        build_s = time.perf_counter() - start
+        print(f"\n{build} build={build_s:.1f}s")
+        report(index, queries, truth, args)
+
+
+def report(index: HNSWIndex, queries: np.ndarray, truth: np.ndarray, args):
+    print(f"{'ef_search':>10}{'recall@k':>10}{'ms/q':>8}{'QPS':>8}{'dist/q':>10}{'% of N':>8}")
+    for ef_search in args.ef_search:
+        index.ef_search = ef_search
+        hits = 0
+        computations = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            indices, _ = index.search(query, args.k)
+            computations += index.get_last_search_stats()["distance_computations"]
+            hits += len(set(indices) & set(expected.tolist()))
+        elapsed = time.perf_counter() - start
+        per_query = computations / len(queries)
+        print(f"{ef_search:>10}{hits / (args.k * len(queries)):>10.3f}{elapsed * 1000 / len(queries):>8.2f}"
+              f"{len(queries) / elapsed:>8.0f}{per_query:>10.0f}{100 * per_query / len(index.vectors):>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from app.services.library_service import LibraryService
 from app.services.document_service import DocumentService
 from app.services.chunk_service import ChunkService
 from app.services.indexing_service import IndexingService
+from app.repositories.migrations import run_migrations
 from app.models.models import LibraryCreate, DocumentCreate, ChunkCreate
 from app.core.logger import logger
 
@@ -95,6 +96,8 @@ async def populate_database():
     logger.info("Starting database population...")
     
     try:
+        run_migrations()
+        
         # Initialize services
         library_service = LibraryService()
         document_service = DocumentService()
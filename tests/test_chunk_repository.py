@@ -0,0 +1,120 @@
+import json
+import sqlite3
+
+from app.core.config import settings
+from app.models.models import ChunkCreate, LibraryCreate
+from app.repositories.chunk_repository import chunk_repository
+from app.repositories.library_repository import library_repository
+from app.repositories.migrations import MIGRATIONS, run_migrations
+
+
+def test_json_embeddings_are_migrated_to_float32_blobs(tmp_path, monkeypatch):
+    db_path = tmp_path / "legacy.sqlite"
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{db_path}")
+    run_migrations()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO libraries (id, name, metadata) VALUES ('lib', 'Legacy', '{}')")
+        conn.execute(
+            "INSERT INTO chunks (id, library_id, text, embedding, metadata, vector_index) VALUES (?, ?, ?, ?, ?, ?)",
+            ("chunk", "lib", "legacy text", json.dumps([0.5, 0.25, -1.0]), "{}", 0)
+        )
+        conn.execute("PRAGMA user_version = 1")
+
+    assert run_migrations() == MIGRATIONS[-1].version
+    repository = chunk_repository
+
+    with sqlite3.connect(db_path) as conn:
+        stored_type, stored_size = conn.execute("SELECT typeof(embedding), length(embedding) FROM chunks").fetchone()
+    assert (stored_type, stored_size) == ("blob", 12)
+    assert repository.get_chunk("lib", None, "chunk").embedding == [0.5, 0.25, -1.0]
+    assert repository.get_chunks_by_library("lib", include_embeddings=False)[0].embedding is None
+
+
+def test_get_all_vectors_returns_ids_in_insert_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'vectors.sqlite'}")
+    monkeypatch.chdir(tmp_path)
+
+    run_migrations()
+    library = library_repository.create_library(LibraryCreate(name="Vectors"))
+    repository = chunk_repository
+    created = [
+        repository.create_chunk(library.id, None, ChunkCreate(text=f"chunk {i}", embedding=[float(i)] * 4))
+        for i in range(5)
+    ]
+    repository.delete_chunk(library.id, None, created[2].id)
+
+    chunk_ids, vectors = repository.get_all_vectors(library.id)
+
+    assert chunk_ids == [created[i].id for i in (0, 1, 3, 4)]
+    assert vectors[:, 0].tolist() == [0.0, 1.0, 3.0, 4.0]
+    assert [chunk.id for chunk in repository.get_indexed_chunks(library.id)] == chunk_ids
+
+
+def test_get_chunks_by_ids_loads_only_requested_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'ids.sqlite'}")
+    monkeypatch.chdir(tmp_path)
+    # Force several IN (...) batches
+    monkeypatch.setattr("app.repositories.chunk_repository.MAX_IN_PARAMETERS", 2)
+
+    run_migrations()
+    library = library_repository.create_library(LibraryCreate(name="Ids"))
+    other = library_repository.create_library(LibraryCreate(name="Other"))
+    repository = chunk_repository
+    created = [
+        repository.create_chunk(library.id, None, ChunkCreate(text=f"chunk {i}", embedding=[float(i)] * 4,
+                                                              metadata={"page": i}))
+        for i in range(5)
+    ]
+    foreign = repository.create_chunk(other.id, None, ChunkCreate(text="foreign", embedding=[9.0] * 4))
+
+    wanted = [created[4].id, created[0].id, created[4].id, "missing", foreign.id, created[2].id]
+    chunks = repository.get_chunks_by_ids(library.id, wanted)
+    assert set(chunks) == {created[0].id, created[2].id, created[4].id}
+    assert chunks[created[4].id].embedding == [4.0] * 4
+
+    metadata = repository.get_indexed_metadata(library.id)
+    assert [chunk_id for chunk_id, _ in metadata] == [chunk.id for chunk in created]
+    assert metadata[3][1]["page"] == 3
+
+
+def test_interrupted_compaction_is_finished_on_next_open(tmp_path, monkeypatch):
+    from app.repositories import vector_store
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'compact.sqlite'}")
+    monkeypatch.chdir(tmp_path)
+
+    run_migrations()
+    library = library_repository.create_library(LibraryCreate(name="Compact"))
+    repository = chunk_repository
+    created = [
+        repository.create_chunk(library.id, None, ChunkCreate(text=f"chunk {i}", embedding=[float(i)] * 4))
+        for i in range(6)
+    ]
+    for i in (0, 3):
+        repository.delete_chunk(library.id, None, created[i].id)
+
+    # The process dies after the remap commits but before the store switches to the new rows
+    def crash(self, generation):
+        raise SystemExit("killed")
+    monkeypatch.setattr(vector_store.VectorStore, "switch_generation", crash)
+    try:
+        repository.compact_vectors(library.id)
+    except SystemExit:
+        pass
+    monkeypatch.undo()
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'compact.sqlite'}")
+    monkeypatch.chdir(tmp_path)
+
+    # A restart reopens the store from its manifest, which still names the old generation
+    vector_store._stores.pop(library.id)
+    repository._synced_stores.discard(library.id)
+    chunk_ids, vectors = repository.get_all_vectors(library.id)
+    assert chunk_ids == [created[i].id for i in (1, 2, 4, 5)]
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 4.0, 5.0]
+    assert vector_store._stores[library.id].count == 4
+
+    # A compaction that completes leaves a single generation on disk
+    repository.delete_chunk(library.id, None, created[1].id)
+    assert repository.compact_vectors(library.id) == 1
+    assert repository.get_all_vectors(library.id)[1][:, 0].tolist() == [2.0, 4.0, 5.0]
+    assert sorted(path.name for path in (tmp_path / "data" / f"vectors_{library.id}").iterdir()) == [
+        "g2_seg000000.f32", "g2_tombstones.u8", "manifest.json"]
@@ -113,3 +113,33 @@ def test_delete_chunk(test_client, mock_cohere_client, sample_library_data, samp
     # Verification
     get_response = test_client.get(f"/libraries/{library_id}/documents/{document_id}/chunks/{chunk_id}")
     assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_chunk_embeddings_are_reused_by_content(test_client, mock_cohere_client, sample_library_data, sample_document_data, monkeypatch):
+    import uuid
+    from app.utils.embedding_cache import embedding_cache
+    embedded = []
+
+    class Provider:
+        def get_embedding(self, text, model=None, input_type=None):
+            embedded.append((text, input_type))
+            return [float(len(text)), 1.0]
+    monkeypatch.setattr(embedding_cache, "provider", Provider())
+
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    # Unique per run, since the persistent cache outlives the test database's libraries
+    paragraph = f"unchanged paragraph {uuid.uuid4()}"
+    before = test_client.get("/metrics").json()["embedding_cache"]["by_input_type"].get("search_document", {})
+
+    first = test_client.post(chunks_url, json={"text": paragraph}).json()
+    # Re-ingesting the same text, and editing a chunk back to it, reuse the stored embedding
+    second = test_client.post(chunks_url, json={"text": paragraph}).json()
+    edited = test_client.post(chunks_url, json={"text": f"draft {uuid.uuid4()}"}).json()
+    response = test_client.put(f"{chunks_url}{edited['id']}", json={"text": paragraph})
+    assert response.status_code == status.HTTP_200_OK
+    assert first["embedding"] == second["embedding"] == response.json()["embedding"] == [float(len(paragraph)), 1.0]
+    assert embedded.count((paragraph, "search_document")) == 1
+
+    after = test_client.get("/metrics").json()["embedding_cache"]["by_input_type"]["search_document"]
+    assert after["persistent_hits"] - before.get("persistent_hits", 0) == 2
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.models.models import LibraryCreate
+from app.repositories.connection_pool import connection_pool
+from app.repositories.library_repository import library_repository
+from app.repositories.migrations import run_migrations
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'pool.sqlite'}")
+    run_migrations()
+    return library_repository
+
+
+def test_connections_are_persistent_per_thread_and_use_wal(repository):
+    conn = connection_pool.get()
+    assert connection_pool.get() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connection_pool.get()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_transaction_rolls_back_every_statement(repository):
+    library = repository.create_library(LibraryCreate(name="Kept"))
+    with pytest.raises(RuntimeError):
+        with repository.transaction():
+            repository.execute_query("UPDATE libraries SET name = ? WHERE id = ?", ("Renamed", library.id))
+            with repository.transaction():
+                repository.execute_query("DELETE FROM libraries WHERE id = ?", (library.id,))
+            raise RuntimeError("abort")
+
+    assert repository.get_library(library.id).name == "Kept"
@@ -58,3 +58,22 @@ def test_delete_document(test_client, mock_cohere_client, sample_library_data, s
     # Verification
     get_response = test_client.get(f"/libraries/{library_id}/documents/{document_id}")
     assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_delete_document_tombstones_its_vectors(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    from app.repositories.vector_store import get_vector_store
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_ids = [test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"] for _ in range(2)]
+    for document_id in document_ids:
+        for i in range(2):
+            test_client.post(f"/libraries/{library_id}/documents/{document_id}/chunks/",
+                             json={"text": f"c{i}", "embedding": [float(i), 1.0], "metadata": {}})
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+
+    response = test_client.delete(f"/libraries/{library_id}/documents/{document_ids[0]}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    # The first document's two rows are dead; the other document's rows stay live
+    assert get_vector_store(library_id).tombstones().tolist() == [True, True, False, False]
+    response = test_client.post(f"/libraries/{library_id}/search/", json={"query_embedding": [0.0, 1.0], "k": 4})
+    assert len(response.json()) == 2
+
@@ -0,0 +1,70 @@
+import threading
+
+from app.utils.embedding_batcher import EmbeddingBatcher
+
+
+class BatchClient:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def get_embeddings_batch(self, texts, model=None, input_type=None):
+        with self.lock:
+            self.calls.append((list(texts), model, input_type))
+        if self.fail:
+            return None
+        return [[float(len(text))] for text in texts]
+
+
+def embed_concurrently(batcher, texts, **kwargs):
+    results = {}
+    barrier = threading.Barrier(len(texts))
+
+    def worker(text):
+        barrier.wait()
+        results[text] = batcher.get_embedding(text, **kwargs)
+    threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_batcher_coalesces_concurrent_requests():
+    client = BatchClient()
+    batcher = EmbeddingBatcher(client, max_batch_size=96, window_seconds=0.2, max_concurrency=2)
+    texts = [f"text {'x' * i}" for i in range(20)]
+
+    results = embed_concurrently(batcher, texts, model="m", input_type="search_document")
+    assert results == {text: [float(len(text))] for text in texts}
+    assert len(client.calls) == 1
+    assert sorted(client.calls[0][0]) == sorted(texts)
+    assert client.calls[0][1:] == ("m", "search_document")
+    batcher.stop()
+    assert batcher.get_stats()["requests"] == 20
+
+
+def test_batcher_splits_at_max_batch_size_and_dedupes():
+    client = BatchClient()
+    batcher = EmbeddingBatcher(client, max_batch_size=4, window_seconds=0.2, max_concurrency=2)
+    results = embed_concurrently(batcher, [f"t{i}" for i in range(10)])
+    assert len(results) == 10
+    assert all(len(texts) <= 4 for texts, _, _ in client.calls)
+    assert sum(len(texts) for texts, _, _ in client.calls) == 10
+    assert EmbeddingBatcher(client, max_batch_size=500, window_seconds=0, max_concurrency=1).max_batch_size == 96
+
+    # Duplicate texts and different input types
+    futures = [batcher.submit("same", input_type="search_query") for _ in range(3)]
+    futures.append(batcher.submit("same", input_type="search_document"))
+    batcher.stop()
+    assert [future.result() for future in futures] == [[4.0]] * 4
+    # One call per input type, each with the text once
+    assert sorted(input_type for texts, _, input_type in client.calls if texts == ["same"]) == ["search_document", "search_query"]
+
+
+def test_batcher_failure_returns_none_to_every_caller():
+    batcher = EmbeddingBatcher(BatchClient(fail=True), max_batch_size=8, window_seconds=0.05, max_concurrency=1)
+    assert embed_concurrently(batcher, ["a", "b"]) == {"a": None, "b": None}
+    batcher.stop()
@@ -0,0 +1,44 @@
+from app.core.config import settings
+from app.repositories.embedding_cache_repository import embedding_cache_repository
+from app.repositories.migrations import run_migrations
+from app.utils.embedding_cache import EmbeddingCache
+
+
+class CountingProvider:
+    def __init__(self):
+        self.calls = []
+
+    def get_embedding(self, text, model=None, input_type=None):
+        self.calls.append((text, model, input_type))
+        if text == "fail":
+            return None
+        return [float(len(text)), 0.5, -1.0]
+
+
+def test_embedding_cache_memory_and_persistent_hits(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'embeddings.sqlite'}")
+    run_migrations()
+    provider = CountingProvider()
+    cache = EmbeddingCache(provider, max_entries=1)
+
+    assert cache.get_embedding("hello", "search_query") == [5.0, 0.5, -1.0]
+    assert cache.get_embedding("hello", "search_query") == [5.0, 0.5, -1.0]
+    assert provider.calls == [("hello", settings.COHERE_MODEL, "search_query")]
+
+    # Input type and model are part of the key
+    cache.get_embedding("hello", "search_document")
+    cache.get_embedding("hello", "search_query", model="other-model")
+    assert len(provider.calls) == 3
+
+    # A new process (or an evicted entry) reads the persistent table instead of the provider
+    fresh = EmbeddingCache(provider, max_entries=10)
+    assert fresh.get_embedding("hello", "search_query") == [5.0, 0.5, -1.0]
+    assert len(provider.calls) == 3
+    assert fresh.get_stats()["persistent_hits"] == 1
+    assert embedding_cache_repository.count_embeddings() == 3
+
+    assert fresh.get_embedding("fail", "search_query") is None
+    assert embedding_cache_repository.count_embeddings() == 3
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["hits"], stats["persistent_hits"], stats["misses"]) == (1, 1, 0, 3)
+    assert stats["by_input_type"]["search_document"] == {"hits": 0, "persistent_hits": 0, "misses": 1}
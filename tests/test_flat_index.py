@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from app.indexing.flat_index import FlatIndex
+
+
+def _reference_distances(vectors, query, metric):
+    distances = []
+    for vector in vectors:
+        if metric == 'cosine':
+            distances.append(1 - np.dot(query, vector) / (np.linalg.norm(query) * np.linalg.norm(vector)))
+        elif metric == 'inner_product':
+            distances.append(-np.dot(query, vector))
+        else:
+            distances.append(np.linalg.norm(query - vector))
+    return np.array(distances)
+
+
+@pytest.mark.parametrize("metric", ["l2", "euclidean", "cosine", "inner_product"])
+def test_flat_search_matches_brute_force(metric):
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(200, 16))
+    query = rng.normal(size=16)
+
+    idx = FlatIndex()
+    assert idx.build_index(vectors, {"distance_metric": metric}) is True
+    indices, distances = idx.search(query.tolist(), k=5)
+
+    expected = _reference_distances(vectors, query, metric)
+    expected_order = np.argsort(expected, kind='stable')[:5]
+    assert indices == expected_order.tolist()
+    assert np.allclose(distances, expected[expected_order])
+
+
+def test_flat_search_k_larger_than_index():
+    vectors = np.eye(3)
+    idx = FlatIndex()
+    idx.build_index(vectors)
+    indices, distances = idx.search([1.0, 0.0, 0.0], k=10)
+
+    assert indices[0] == 0
+    assert len(indices) == 3
+    assert distances == sorted(distances)
+
+
+def test_flat_rejects_unknown_metric():
+    idx = FlatIndex()
+    assert idx.build_index(np.eye(3), {"distance_metric": "manhattan"}) is False
+
+
+@pytest.mark.parametrize("metric", ["l2", "cosine", "inner_product"])
+def test_flat_search_batch_matches_single_queries(metric):
+    rng = np.random.default_rng(11)
+    vectors = rng.normal(size=(150, 12))
+    queries = rng.normal(size=(4, 12))
+
+    idx = FlatIndex()
+    idx.build_index(vectors, {"distance_metric": metric})
+    batch = idx.search_batch(queries.tolist(), k=5)
+
+    assert len(batch) == 4
+    for query, (indices, distances) in zip(queries, batch):
+        single_indices, single_distances = idx.search(query.tolist(), k=5)
+        assert indices == single_indices
+        assert np.allclose(distances, single_distances)
+
+
+def test_flat_search_respects_allow_list():
+    rng = np.random.default_rng(17)
+    vectors = rng.normal(size=(100, 8))
+    allowed = np.zeros(100, dtype=bool)
+    allowed[[3, 40, 77]] = True
+
+    idx = FlatIndex()
+    idx.build_index(vectors)
+    indices, _ = idx.search(vectors[5].tolist(), k=5, search_params={'allowed': allowed})
+    assert sorted(indices) == [3, 40, 77]
+    [(batch_indices, _)] = idx.search_batch([vectors[5].tolist()], k=5, search_params={'allowed': allowed})
+    assert batch_indices == indices
+
+    with pytest.raises(ValueError):
+        idx.search(vectors[5].tolist(), k=5, search_params={'allowed': np.ones(101, dtype=bool)})
@@ -25,3 +25,156 @@ def test_hnsw_build_and_search():
     assert len(distances) > 0
     # distance for the top-1 should be numeric and finite
     assert np.isfinite(distances[0])
+
+
+def test_hnsw_search_is_sublinear_and_accurate():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(2000, 16)).astype(np.float32)
+    idx = HNSWIndex()
+    assert idx.build_index(vectors, {'M': 8, 'ef_construction': 64})
+    idx.ef_search = 64
+
+    queries = rng.normal(size=(20, 16)).astype(np.float32)
+    hits = 0
+    for query in queries:
+        indices, _ = idx.search(query.tolist(), k=10)
+        exact = np.argsort(np.linalg.norm(vectors - query, axis=1))[:10]
+        hits += len(set(indices) & set(exact.tolist()))
+        stats = idx.get_last_search_stats()
+        assert stats['vector_count'] == len(vectors)
+        assert 0 < stats['distance_computations'] < len(vectors) // 2
+        assert idx.search(query.tolist(), k=10, search_params={'exact': True})[0] == exact.tolist()
+
+    assert hits / (10 * len(queries)) >= 0.8
+
+
+def test_hnsw_visited_tags_are_reused_and_wrap():
+    rng = np.random.default_rng(11)
+    vectors = rng.normal(size=(200, 8)).astype(np.float32)
+    idx = HNSWIndex()
+    assert idx.build_index(vectors, {'M': 8, 'ef_construction': 32})
+    query = vectors[17].tolist()
+    expected = idx.search(query, k=5)
+
+    # Repeated searches reuse the thread's visited array without clearing it
+    tags = idx._visited.tags
+    assert idx.search(query, k=5) == expected
+    assert idx._visited.tags is tags
+
+    # Exhausting the generation counter resets the array instead of aliasing stale tags
+    idx._visited.generation = np.iinfo(np.uint32).max
+    assert idx.search(query, k=5) == expected
+    assert idx._visited.generation < 10
+
+
+def test_hnsw_heuristic_selection_prefers_diverse_neighbors():
+    idx = HNSWIndex()
+    idx.vectors = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [0.0, 1.5]])
+    candidates = [(1, 1.0), (3, 1.5), (2, 2.0)]
+
+    # Element 2 sits behind element 1, so the heuristic links base to 1 and 3 only
+    assert idx._select_neighbors(idx.vectors[0], candidates, 3, 0) == [1, 3]
+    idx.keep_pruned_connections = True
+    assert idx._select_neighbors(idx.vectors[0], candidates, 3, 0) == [1, 3, 2]
+    idx.neighbor_selection = 'simple'
+    assert idx._select_neighbors(idx.vectors[0], candidates, 2, 0) == [1, 3]
+
+
+def test_hnsw_build_parameters():
+    vectors = np.random.default_rng(5).normal(size=(100, 4))
+    idx = HNSWIndex()
+    assert idx.build_index(vectors, {'M': 4, 'M0': 12, 'neighbor_selection': 'simple'})
+    assert idx.layer0_neighbors.shape[1] == 12
+    assert idx.upper_neighbors.shape[1] == 4
+    assert idx.mL == 1 / np.log(4)
+    assert idx.get_index_info()['neighbor_selection'] == 'simple'
+
+    assert HNSWIndex().build_index(vectors, {'M': 1}) is False
+    assert HNSWIndex().build_index(vectors, {'M': 8, 'M0': 4}) is False
+    assert HNSWIndex().build_index(vectors, {'neighbor_selection': 'random'}) is False
+    assert HNSWIndex().build_index(vectors, {'num_workers': 0}) is False
+
+
+def test_hnsw_parallel_build_is_accurate(monkeypatch):
+    # Shrink the serial seed so most inserts are searched by the worker processes
+    monkeypatch.setattr(HNSWIndex, 'PARALLEL_SEED_SIZE', 100)
+    rng = np.random.default_rng(13)
+    vectors = rng.normal(size=(1500, 16)).astype(np.float32)
+    idx = HNSWIndex()
+    assert idx.build_index(vectors, {'M': 8, 'ef_construction': 64, 'num_workers': 2})
+    idx.ef_search = 64
+
+    assert (idx.layer0_degrees > 0).all()
+    assert (idx.layer0_degrees <= idx.M0).all()
+    assert idx.entry_point[1] == idx.node_levels.max()
+    # The links were copied out of the build's memory maps
+    assert idx.layer0_neighbors.flags.owndata and idx.upper_neighbors.flags.owndata
+    queries = rng.normal(size=(20, 16)).astype(np.float32)
+    hits = 0
+    for query in queries:
+        indices, _ = idx.search(query.tolist(), k=10)
+        exact = np.argsort(np.linalg.norm(vectors - query, axis=1))[:10]
+        hits += len(set(indices) & set(exact.tolist()))
+    assert hits / (10 * len(queries)) >= 0.8
+
+
+def test_hnsw_incremental_add_delete_and_update(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+    idx = HNSWIndex()
+    assert idx.build_index(vectors[:200], {'M': 8, 'ef_construction': 64})
+    idx.ids = [f"c{i}" for i in range(200)]
+
+    positions = idx.add_items(vectors[200:], [f"c{i}" for i in range(200, 300)])
+    assert positions == list(range(200, 300))
+    for i in (5, 150, 250, 299):
+        assert idx.search(vectors[i].tolist(), k=1)[0] == [i]
+
+    # Deleted elements are bypassed and the entry point moves off them
+    entry = idx.entry_point[0]
+    for chunk_id in (f"c{entry}", "c250"):
+        assert idx.mark_deleted(chunk_id) is True
+    assert idx.mark_deleted("c250") is False
+    assert entry not in idx.search(vectors[entry].tolist(), k=10)[0]
+    assert 250 not in idx.search(vectors[250].tolist(), k=10)[0]
+    assert idx.entry_point[0] != entry
+
+    position = idx.update_item("c10", vectors[10] + 100.0)
+    assert idx.ids[position] == "c10"
+    assert idx.search((vectors[10] + 100.0).tolist(), k=1)[0] == [position]
+    assert 10 not in idx.search(vectors[10].tolist(), k=10)[0]
+
+    # Spare capacity is trimmed on save, and a memory-mapped copy can still take writes
+    path = str(tmp_path / "index_lib_HNSW.idx")
+    assert idx.save_index(path)
+    loaded = HNSWIndex()
+    assert loaded.load_index(path)
+    assert loaded.deleted_count == 3
+    assert len(loaded.node_levels) == len(loaded.vectors) == 301
+    loaded.add_items(vectors[:1] + 50.0, ["fresh"])
+    assert loaded.search((vectors[0] + 50.0).tolist(), k=1)[0] == [301]
+    assert loaded.mark_deleted("c20") is True
+
+
+def test_hnsw_search_respects_allow_list():
+    rng = np.random.default_rng(19)
+    vectors = rng.normal(size=(1000, 8)).astype(np.float32)
+    idx = HNSWIndex()
+    assert idx.build_index(vectors, {'M': 8, 'ef_construction': 64})
+    # A selective filter: 2% of elements, none near the query
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[::50] = True
+    query = vectors[1].tolist()
+
+    expected = np.flatnonzero(allowed)[np.argsort(np.linalg.norm(vectors[allowed] - vectors[1], axis=1))[:10]]
+    indices, _ = idx.search(query, k=10, search_params={'allowed': allowed})
+    assert len(indices) == 10
+    assert allowed[indices].all()
+    assert len(set(indices) & set(expected.tolist())) >= 8
+    assert idx.search(query, k=10, search_params={'allowed': allowed, 'exact': True})[0] == expected.tolist()
+    assert idx.search(query, k=10, search_params={'allowed': np.zeros(len(vectors), dtype=bool)}) == ([], [])
+
+    # The subset scan reports its own work, not that of the previous search
+    [(indices, _)] = idx.search_subset([query], np.flatnonzero(allowed), k=10)
+    assert indices == expected.tolist()
+    assert idx.get_last_search_stats() == {'distance_computations': int(allowed.sum()), 'vector_count': len(vectors), 'exact': True}
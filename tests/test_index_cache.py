@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+from app.indexing.flat_index import FlatIndex
+from app.indexing.index_storage import get_index_path
+from app.utils.index_cache import IndexCache, index_cache, load_index
+from app.utils.locking import lock_manager
+
+
+def _flat_index(rows: int) -> FlatIndex:
+    idx = FlatIndex()
+    idx.build_index(np.zeros((rows, 4)))
+    return idx
+
+
+def test_index_cache_evicts_least_recently_used():
+    # each index is rows * 4 * 8 bytes
+    cache = IndexCache(max_bytes=2 * 10 * 4 * 8)
+    cache.put("lib-a", "FLAT", _flat_index(10))
+    cache.put("lib-b", "FLAT", _flat_index(10))
+    assert cache.get("lib-a", "FLAT") is not None
+
+    cache.put("lib-c", "FLAT", _flat_index(10))
+
+    assert cache.get("lib-b", "FLAT") is None
+    assert cache.get("lib-a", "FLAT") is not None
+    assert cache.get("lib-c", "FLAT") is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_index_cache_invalidate_and_oversized_entries():
+    cache = IndexCache(max_bytes=1000)
+    cache.put("lib-a", "FLAT", _flat_index(10))
+    cache.put("lib-a", "HNSW", _flat_index(1))
+    cache.invalidate("lib-a", "FLAT")
+
+    assert cache.get("lib-a", "FLAT") is None
+    assert cache.get("lib-a", "HNSW") is not None
+
+    cache.put("lib-big", "FLAT", _flat_index(1000))
+    assert cache.get("lib-big", "FLAT") is None
+
+
+def test_load_index_never_replaces_a_newer_cached_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    _flat_index(5).save_index(get_index_path("lib-race", "FLAT"))
+    index_cache.invalidate("lib-race")
+    loaded = []
+
+    # A writer holds the library lock while a search misses the cache and waits to load the old file
+    with lock_manager.get_lock("lib-race"):
+        reader = threading.Thread(target=lambda: loaded.append(load_index("lib-race", "FLAT")))
+        reader.start()
+        time.sleep(0.1)
+        newer = _flat_index(6)
+        index_cache.put("lib-race", "FLAT", newer)
+    reader.join()
+
+    assert loaded == [newer]
+    assert index_cache.get("lib-race", "FLAT") is newer
+    index_cache.invalidate("lib-race")
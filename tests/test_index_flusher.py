@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.indexing.flat_index import FlatIndex
+from app.indexing.index_storage import get_index_path
+from app.utils.index_flusher import IndexFlusher
+
+
+def make_index() -> FlatIndex:
+    index = FlatIndex()
+    index.build_index(np.eye(3), {})
+    return index
+
+
+def test_flush_saves_dirty_indexes_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    flusher = IndexFlusher(interval_seconds=60)
+    index = make_index()
+
+    flusher.mark_dirty("lib", "FLAT", index)
+    assert flusher.get_pending("lib", "FLAT") is index
+    assert flusher.stop() == 1
+    assert (tmp_path / get_index_path("lib", "FLAT")).exists()
+    assert flusher.get_pending("lib", "FLAT") is None
+    assert flusher.flush() == 0
+
+
+def test_discard_drops_unsaved_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    flusher = IndexFlusher(interval_seconds=60)
+
+    flusher.mark_dirty("lib", "FLAT", make_index())
+    flusher.discard("lib")
+    assert flusher.stop() == 0
+    assert not (tmp_path / get_index_path("lib", "FLAT")).exists()
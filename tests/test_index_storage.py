@@ -0,0 +1,70 @@
+import pickle
+
+import numpy as np
+
+from app.indexing.flat_index import FlatIndex
+from app.indexing.hnsw_index import HNSWIndex
+from app.indexing.index_storage import read_index_file, write_index_file
+
+
+def test_index_file_round_trip_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "test.idx")
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    write_index_file(path, {"built": True, "name": "x"}, {"vectors": vectors, "empty": np.zeros(0, dtype=np.int32)})
+
+    attributes, arrays = read_index_file(path)
+
+    assert attributes == {"built": True, "name": "x"}
+    assert isinstance(arrays["vectors"], np.memmap)
+    assert arrays["vectors"].ctypes.data % 64 == 0
+    assert np.array_equal(arrays["vectors"], vectors)
+    assert arrays["empty"].shape == (0,)
+
+
+def test_hnsw_save_and_load_preserves_search(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(50, 8))
+    idx = HNSWIndex()
+    idx.build_index(vectors)
+    path = str(tmp_path / "index_lib_HNSW.idx")
+    assert idx.save_index(path) is True
+
+    loaded = HNSWIndex()
+    assert loaded.load_index(path) is True
+    assert loaded.entry_point == idx.entry_point
+    assert np.array_equal(loaded.node_levels, idx.node_levels)
+    assert np.array_equal(loaded.layer0_neighbors, idx.layer0_neighbors)
+    assert np.array_equal(loaded.upper_neighbors, idx.upper_neighbors)
+    assert loaded.search(vectors[5].tolist(), k=3) == idx.search(vectors[5].tolist(), k=3)
+
+
+def test_legacy_pickle_is_migrated(tmp_path):
+    vectors = np.eye(4)
+    with open(tmp_path / "index_lib_FLAT.pkl", "wb") as f:
+        pickle.dump({"index": None, "vectors": vectors, "built": True, "distance_metric": "cosine"}, f)
+    path = str(tmp_path / "index_lib_FLAT.idx")
+
+    idx = FlatIndex()
+    assert idx.load_index(path) is True
+    assert (tmp_path / "index_lib_FLAT.idx").exists()
+    assert idx.distance_metric == "cosine"
+    assert idx.search([0.0, 1.0, 0.0, 0.0], k=1)[0] == [1]
+
+
+def test_legacy_hnsw_levels_are_converted_to_blocks(tmp_path):
+    vectors = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [5.0, 5.0]])
+    levels = [
+        {0: {"id": 0, "neighbors": [1, 2]}, 1: {"id": 1, "neighbors": [0]},
+         2: {"id": 2, "neighbors": [0, 3]}, 3: {"id": 3, "neighbors": [2]}},
+        {0: {"id": 0, "neighbors": [2]}, 2: {"id": 2, "neighbors": [0]}},
+    ]
+    with open(tmp_path / "index_lib_HNSW.pkl", "wb") as f:
+        pickle.dump({"index": None, "vectors": vectors, "built": True, "levels": levels,
+                     "entry_point": (0, 1), "M": 2}, f)
+
+    idx = HNSWIndex()
+    assert idx.load_index(str(tmp_path / "index_lib_HNSW.idx")) is True
+    assert idx.node_levels.tolist() == [1, 0, 1, 0]
+    assert idx._get_neighbors(2, 0).tolist() == [0, 3]
+    assert idx._get_neighbors(2, 1).tolist() == [0]
+    assert idx.search([4.0, 4.0], k=1)[0] == [3]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.indexing.metadata_table import MetadataTable
+from app.models.models import ChunkMetadata
+from app.services.query_service import QueryService
+
+
+def sample_metadata():
+    rng = np.random.default_rng(23)
+    rows = []
+    for i in range(200):
+        row = {"source": ["web", "pdf", "email", None][i % 4], "page": int(rng.integers(0, 50))}
+        if i % 3 == 0:
+            row["score"] = float(rng.random())
+        if i % 5 == 0:
+            row["tags"] = ["a", "b"] if i % 2 else "ab"
+        if i % 7 == 0:
+            row["flag"] = bool(i % 2)
+        rows.append(ChunkMetadata(**row))
+    return rows
+
+
+@pytest.mark.parametrize("metadata_filter", [
+    {},
+    {"source": "web"},
+    {"source": None},
+    {"source": {"$ne": "pdf"}},
+    {"source": {"$in": ["web", "email"]}},
+    {"source": {"$nin": ["web", None]}},
+    {"source": {"$contains": "e"}},
+    {"page": {"$gte": 10, "$lt": 20}},
+    {"page": {"$gt": 45}, "source": "pdf"},
+    {"score": {"$lte": 0.5}},
+    {"score": {}},
+    {"page": {"$gt": "10"}},
+    {"tags": {"$contains": "a"}},
+    {"tags": ["a", "b"]},
+    {"flag": {"$gte": 1}},
+    {"page": {"$regex": "1"}},
+    {"missing": 1},
+])
+def test_table_matches_per_chunk_filter(metadata_filter):
+    rows = sample_metadata()
+    table = MetadataTable([f"c{i}" for i in range(len(rows))], rows)
+    service = QueryService()
+    expected = [service._matches_metadata_filter(row, metadata_filter) for row in rows]
+    assert table.evaluate(metadata_filter).tolist() == expected
+
+
+def test_table_tracks_writes():
+    table = MetadataTable(["a", "b", None], [{"source": "web"}, {"source": "pdf"}, None])
+    assert table.evaluate({}).tolist() == [True, True, False]
+
+    table.set_row(5, "c", {"source": "web", "page": 3})
+    assert table.evaluate({"source": "web"}).tolist() == [True, False, False, False, False, True]
+
+    # Moving a chunk to a new position clears its old one
+    table.set_row(6, "a", {"source": "email"})
+    assert np.flatnonzero(table.evaluate({"source": {"$in": ["web", "email"]}})).tolist() == [5, 6]
+
+    assert table.update("b", {"page": 1})
+    assert table.evaluate({"source": "pdf"}).sum() == 0
+    assert np.flatnonzero(table.evaluate({"page": {"$lt": 5}})).tolist() == [1, 5]
+
+    assert table.remove("c")
+    assert not table.remove("c")
+    assert np.flatnonzero(table.evaluate({"page": {"$lt": 5}})).tolist() == [1]
@@ -0,0 +1,24 @@
+import sqlite3
+
+from app.core.config import settings
+from app.repositories.migrations import MIGRATIONS, run_migrations
+
+
+def test_migrations_create_schema_once(tmp_path, monkeypatch):
+    db_path = tmp_path / "fresh.sqlite"
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{db_path}")
+
+    assert run_migrations() == MIGRATIONS[-1].version
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO libraries (id, name, metadata) VALUES ('lib', 'Kept', '{}')")
+
+    # A second start is a no-op and leaves existing rows alone
+    assert run_migrations() == MIGRATIONS[-1].version
+    with sqlite3.connect(db_path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"libraries", "documents", "chunks"} <= tables
+        assert conn.execute("SELECT name FROM libraries").fetchall() == [("Kept",)]
+
+
+def test_migration_versions_are_sequential():
+    assert [migration.version for migration in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
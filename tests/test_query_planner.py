@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from app.indexing.flat_index import FlatIndex
+from app.indexing.hnsw_index import HNSWIndex
+from app.services.query_planner import QueryPlanner
+
+
+@pytest.fixture
+def large_hnsw():
+    # The planner only reads the index size and beam settings, so no graph is needed
+    index = HNSWIndex()
+    index.vectors = np.zeros((1_000_000, 2), dtype=np.float32)
+    return index
+
+
+def allow_fraction(count: int, fraction: float) -> np.ndarray:
+    allowed = np.zeros(count, dtype=bool)
+    allowed[:int(count * fraction)] = True
+    return allowed
+
+
+@pytest.mark.parametrize("fraction, search_params, strategy", [
+    (0.00005, {}, 'exact_subset'),
+    (0.2, {'ef_search': 16}, 'filtered_ann'),
+    (0.5, {}, 'post_filter'),
+    (0.5, {'exact': True}, 'exact_subset'),
+])
+def test_planner_picks_cheapest_strategy(large_hnsw, fraction, search_params, strategy):
+    allowed = allow_fraction(len(large_hnsw.vectors), fraction)
+    plan = QueryPlanner().plan(large_hnsw, 10, search_params, allowed)
+    assert plan.strategy == strategy
+    assert plan.allowed_count == allowed.sum()
+    assert plan.selectivity == pytest.approx(fraction)
+    assert plan.estimated_costs[strategy] == min(plan.estimated_costs.values())
+
+
+def test_planner_over_fetches_for_post_filter(large_hnsw):
+    plan = QueryPlanner().plan(large_hnsw, 10, {}, allow_fraction(len(large_hnsw.vectors), 0.5))
+    assert plan.candidate_count == 30
+
+
+def test_planner_without_filter_and_for_flat():
+    index = FlatIndex()
+    index.build_index(np.eye(4))
+    planner = QueryPlanner()
+    assert planner.plan(index, 2, {}, None).strategy == 'unfiltered'
+    # Scanning the matching subset is never more work than a masked scan of every vector
+    assert planner.plan(index, 2, {}, np.ones(4, dtype=bool)).strategy == 'exact_subset'
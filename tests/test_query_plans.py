@@ -0,0 +1,30 @@
+import pytest
+
+from app.core.config import settings
+from app.repositories.connection_pool import connection_pool
+from app.repositories.migrations import run_migrations
+
+# Hot library/document scoped queries and the index each one must use
+HOT_QUERIES = [
+    ("SELECT * FROM chunks WHERE library_id = ? AND document_id = ?", "idx_chunks_library_document"),
+    ("SELECT * FROM chunks WHERE library_id = ?", "idx_chunks_library_"),
+    ("SELECT id, vector_index FROM chunks WHERE library_id = ? AND vector_index >= 0 ORDER BY rowid", "idx_chunks_library_vector"),
+    ("SELECT * FROM documents WHERE library_id = ?", "idx_documents_library"),
+    ("SELECT * FROM chunks WHERE library_id = ? AND id IN (?, ?, ?)", "sqlite_autoindex_chunks_1"),
+    ("SELECT id, metadata FROM chunks WHERE library_id = ? AND vector_index >= 0 ORDER BY rowid", "idx_chunks_library_vector"),
+    ("DELETE FROM chunks WHERE document_id = ?", "idx_chunks_document"),
+]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{tmp_path / 'plans.sqlite'}")
+    run_migrations()
+    return connection_pool.get()
+
+
+@pytest.mark.parametrize("query, index_name", HOT_QUERIES)
+def test_hot_queries_use_indexes(conn, query, index_name):
+    plan = " | ".join(row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", (None,) * query.count("?")))
+    assert index_name in plan
+    assert "SCAN chunks" not in plan and "SCAN documents" not in plan
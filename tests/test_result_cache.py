@@ -0,0 +1,44 @@
+from app.utils.result_cache import ResultCache
+
+
+def test_result_cache_key_canonicalizes_filter_and_quantizes_query():
+    key = ResultCache.make_key("lib", "HNSW", [0.1, 0.2], 5, {"a": 1, "b": {"$gt": 2}}, {"exact": False})
+    assert key == ResultCache.make_key("lib", "HNSW", [0.1, 0.2], 5, {"b": {"$gt": 2}, "a": 1}, {"exact": False})
+    # Queries equal at float32 precision search identically
+    assert key == ResultCache.make_key("lib", "HNSW", [0.1 + 1e-12, 0.2], 5, {"a": 1, "b": {"$gt": 2}}, {"exact": False})
+    assert key != ResultCache.make_key("lib", "HNSW", [0.1, 0.2], 6, {"a": 1, "b": {"$gt": 2}}, {"exact": False})
+    assert key != ResultCache.make_key("lib", "FLAT", [0.1, 0.2], 5, {"a": 1, "b": {"$gt": 2}}, {"exact": False})
+    assert key != ResultCache.make_key("lib", "HNSW", [0.1, 0.2], 5, {"a": 1, "b": {"$gt": 2}}, {"exact": True})
+
+
+def test_result_cache_generation_invalidates_library():
+    cache = ResultCache(max_entries=10, max_bytes=1000)
+    cache.put("a", "lib-a", cache.generation("lib-a"), "results-a", 10)
+    cache.put("b", "lib-b", cache.generation("lib-b"), "results-b", 10)
+    assert cache.get("a") == "results-a"
+
+    cache.bump("lib-a")
+    assert cache.get("a") is None
+    assert cache.get("b") == "results-b"
+    # Results computed before a write are not cached under the old generation
+    cache.put("a", "lib-a", 0, "stale", 10)
+    assert cache.get("a") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["stale"], stats["entries"]) == (2, 2, 1, 1)
+
+
+def test_result_cache_evicts_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2, max_bytes=100)
+    cache.put("a", "lib", 0, 1, 10)
+    cache.put("b", "lib", 0, 2, 10)
+    cache.get("a")
+    cache.put("c", "lib", 0, 3, 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.put("d", "lib", 0, 4, 95)
+    assert cache.get_stats()["entries"] == 1
+    cache.put("e", "lib", 0, 5, 101)
+    assert cache.get("e") is None
+    assert cache.get_stats()["evictions"] == 3
+    assert not ResultCache(max_entries=0, max_bytes=100).enabled
@@ -68,3 +68,227 @@ def test_search_without_index(test_client, mock_cohere_client, sample_library_da
     response = test_client.post(f"/libraries/{library_id}/search/", json=search_data)
     
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+def test_batch_search(test_client, mock_cohere_client, sample_library_data, sample_document_data, sample_chunk_data):
+    library_response = test_client.post("/libraries/", json=sample_library_data)
+    library_id = library_response.json()["id"]
+    document_response = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data)
+    document_id = document_response.json()["id"]
+    test_client.post(
+        f"/libraries/{library_id}/documents/{document_id}/chunks/", 
+        json=sample_chunk_data
+    )
+    test_client.post(f"/libraries/{library_id}/index/?index_type=FLAT", json={})
+    batch_data = {
+        "query_embeddings": [
+            [0.1, 0.2, 0.3, 0.4, 0.5] * 64,
+            [0.5, 0.4, 0.3, 0.2, 0.1] * 64
+        ],
+        "k": 3
+    }
+    response = test_client.post(f"/libraries/{library_id}/search/batch?index_type=FLAT", json=batch_data)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 2
+    for results in response.json():
+        assert len(results) == 1
+        assert "chunk" in results[0]
+        assert "score" in results[0]
+
+def test_chunk_writes_update_built_index(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(3):
+        test_client.post(chunks_url, json={"text": f"seed {i}", "embedding": [float(i), 1.0, 0.0, 0.0], "metadata": {}})
+    test_client.post(f"/libraries/{library_id}/index/", json={"index_type": "HNSW", "parameters": {}})
+
+    # A chunk created after the build is searchable without a rebuild
+    new_chunk = test_client.post(chunks_url, json={"text": "late", "embedding": [0.0, 0.0, 9.0, 0.0], "metadata": {}}).json()
+    query = {"query_embedding": [0.0, 0.0, 9.0, 0.0], "k": 1, "metadata_filter": {}}
+    response = test_client.post(f"/libraries/{library_id}/search/", json=query)
+    assert response.json()[0]["chunk"]["id"] == new_chunk["id"]
+
+    # Once deleted it is never returned again
+    test_client.delete(f"{chunks_url}{new_chunk['id']}")
+    response = test_client.post(f"/libraries/{library_id}/search/", json={**query, "k": 4})
+    assert len(response.json()) == 3
+    assert new_chunk["id"] not in [result["chunk"]["id"] for result in response.json()]
+
+def test_search_knobs(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(6):
+        source = "keep" if i >= 4 else "skip"
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 0.0, 0.0, 0.0],
+                                           "metadata": {"source": source}})
+    test_client.post(f"/libraries/{library_id}/index/", params={"index_type": "HNSW"}, json={"ef_search": 8})
+    assert test_client.get(f"/libraries/{library_id}/index/", params={"index_type": "HNSW"}).json()["ef_search"] == 8
+
+    search_url = f"/libraries/{library_id}/search/"
+    query = {"query_embedding": [0.0, 0.0, 0.0, 0.0], "k": 2}
+    for knobs in ({"ef_search": 2}, {"exact": True}):
+        response = test_client.post(search_url, json={**query, **knobs})
+        assert [r["chunk"]["text"] for r in response.json()] == ["c0", "c1"]
+
+    # The filter is applied inside the index, so the farthest chunks still fill k
+    filtered = {**query, "metadata_filter": {"source": "keep"}}
+    for knobs in ({}, {"max_candidates": 6}, {"exact": True}):
+        response = test_client.post(search_url, json={**filtered, **knobs})
+        assert [r["chunk"]["text"] for r in response.json()] == ["c4", "c5"]
+
+    assert test_client.post(search_url, json={**query, "max_candidates": 1}).status_code == status.HTTP_400_BAD_REQUEST
+    assert test_client.post(search_url, json={**query, "ef_search": 0}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = test_client.post(f"{search_url}batch", json={"query_embeddings": [query["query_embedding"]], "k": 2, "exact": True})
+    assert [r["chunk"]["text"] for r in response.json()[0]] == ["c0", "c1"]
+
+def test_search_debug_returns_query_plan(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(4):
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 0.0], "metadata": {"source": f"s{i % 2}"}})
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+
+    query = {"query_embedding": [0.0, 0.0], "k": 2, "metadata_filter": {"source": "s1"}}
+    response = test_client.post(f"/libraries/{library_id}/search/", json={**query, "debug": True})
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert [r["chunk"]["text"] for r in body["results"]] == ["c1", "c3"]
+    assert body["debug"]["strategy"] == "exact_subset"
+    assert body["debug"]["allowed_count"] == 2
+    assert body["debug"]["selectivity"] == 0.5
+
+    response = test_client.post(f"/libraries/{library_id}/search/", json=query)
+    assert [r["chunk"]["text"] for r in response.json()] == ["c1", "c3"]
+
+def test_filtered_search_follows_metadata_updates(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    chunk_ids = [
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 0.0], "metadata": {"source": "a"}}).json()["id"]
+        for i in range(3)
+    ]
+    search_url = f"/libraries/{library_id}/search/"
+    for index_type in ("HNSW", "FLAT"):
+        test_client.post(f"/libraries/{library_id}/index/", params={"index_type": index_type}, json={})
+        # The first filtered search builds the index's metadata table
+        query = {"query_embedding": [0.0, 0.0], "k": 3, "metadata_filter": {"source": "b"}}
+        assert test_client.post(search_url, params={"index_type": index_type}, json=query).json() == []
+
+    # A metadata-only update and a new chunk reach the tables without a rebuild
+    test_client.put(f"{chunks_url}{chunk_ids[2]}", json={"text": "c2", "embedding": [2.0, 0.0], "metadata": {"source": "b"}})
+    new_id = test_client.post(chunks_url, json={"text": "c3", "embedding": [3.0, 0.0], "metadata": {"source": "b"}}).json()["id"]
+    response = test_client.post(search_url, params={"index_type": "HNSW"}, json=query)
+    assert [r["chunk"]["id"] for r in response.json()] == [chunk_ids[2], new_id]
+    response = test_client.post(search_url, params={"index_type": "FLAT"}, json=query)
+    assert [r["chunk"]["id"] for r in response.json()] == [chunk_ids[2]]
+
+def test_search_hydrates_only_hits(test_client, mock_cohere_client, sample_library_data, sample_document_data, monkeypatch):
+    from app.repositories.chunk_repository import chunk_repository
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(20):
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 1.0], "metadata": {}})
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("search loaded every chunk of the library")
+    monkeypatch.setattr(chunk_repository, "get_indexed_chunks", fail)
+    monkeypatch.setattr(chunk_repository, "get_chunks_by_library", fail)
+    requested = []
+    get_chunks_by_ids = chunk_repository.get_chunks_by_ids
+    monkeypatch.setattr(chunk_repository, "get_chunks_by_ids",
+                        lambda library_id, chunk_ids, **kwargs: requested.append(chunk_ids) or get_chunks_by_ids(library_id, chunk_ids, **kwargs))
+
+    response = test_client.post(f"/libraries/{library_id}/search/", json={"query_embedding": [3.2, 1.0], "k": 3})
+    assert [r["chunk"]["text"] for r in response.json()] == ["c3", "c4", "c2"]
+    assert [len(ids) for ids in requested] == [3]
+
+def test_post_filter_hydrates_only_k_matches(test_client, mock_cohere_client, sample_library_data, sample_document_data, monkeypatch):
+    from app.models.models import QueryPlan
+    from app.repositories.chunk_repository import chunk_repository
+    from app.services.query_service import QueryService
+    from app.utils.index_cache import load_index
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(20):
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 1.0], "metadata": {"source": f"s{i % 2}"}})
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+
+    query_service = QueryService()
+    index = load_index(library_id, "HNSW")
+    metadata_filter = {"source": "s0"}
+    allowed = query_service._get_allowed_mask(library_id, index, metadata_filter)
+    requested = []
+    get_chunks_by_ids = chunk_repository.get_chunks_by_ids
+    monkeypatch.setattr(chunk_repository, "get_chunks_by_ids",
+                        lambda library_id, chunk_ids, **kwargs: requested.append(chunk_ids) or get_chunks_by_ids(library_id, chunk_ids, **kwargs))
+    monkeypatch.setattr(query_service, "_matches_metadata_filter",
+                        lambda *args: pytest.fail("post-filtered hits were checked chunk by chunk"))
+
+    plan = QueryPlan(strategy="post_filter", vector_count=20, candidate_count=12, allowed_count=10, selectivity=0.5)
+    [results] = query_service._execute_plan(library_id, index, [[5.2, 1.0]], plan, {}, allowed, metadata_filter, 3)
+    assert [r.chunk.text for r in results] == ["c6", "c4", "c8"]
+    assert plan.fallback is None
+    assert [len(ids) for ids in requested] == [3]
+
+def test_search_results_are_cached_until_a_write(test_client, mock_cohere_client, sample_library_data, sample_document_data):
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    chunk_ids = [
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 1.0], "metadata": {"page": i}}).json()["id"]
+        for i in range(5)
+    ]
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+    search_url = f"/libraries/{library_id}/search/"
+    query = {"query_embedding": [1.1, 1.0], "k": 2, "metadata_filter": {"page": {"$lte": 3}}, "debug": True}
+
+    first = test_client.post(search_url, json=query).json()
+    hits = test_client.get("/metrics").json()["result_cache"]["hits"]
+    second = test_client.post(search_url, json=query).json()
+    assert second["results"] == first["results"]
+    assert second["debug"]["cached"] is True
+    assert test_client.get("/metrics").json()["result_cache"]["hits"] == hits + 1
+
+    # A chunk write moves the library to a new generation
+    test_client.put(f"{chunks_url}{chunk_ids[1]}", json={"text": "moved", "embedding": [9.0, 1.0], "metadata": {"page": 1}})
+    response = test_client.post(search_url, json=query).json()
+    assert response["debug"]["cached"] is False
+    assert [r["chunk"]["text"] for r in response["results"]] == ["c2", "c0"]
+
+def test_search_by_query_text_uses_cached_embedding(test_client, mock_cohere_client, sample_library_data, sample_document_data, monkeypatch):
+    import uuid
+    from app.utils.embedding_cache import embedding_cache
+    calls = []
+
+    class Provider:
+        def get_embedding(self, text, model=None, input_type=None):
+            calls.append(input_type)
+            return [3.0, 1.0]
+    monkeypatch.setattr(embedding_cache, "provider", Provider())
+
+    library_id = test_client.post("/libraries/", json=sample_library_data).json()["id"]
+    document_id = test_client.post(f"/libraries/{library_id}/documents/", json=sample_document_data).json()["id"]
+    chunks_url = f"/libraries/{library_id}/documents/{document_id}/chunks/"
+    for i in range(5):
+        test_client.post(chunks_url, json={"text": f"c{i}", "embedding": [float(i), 1.0], "metadata": {}})
+    test_client.post(f"/libraries/{library_id}/index/", json={})
+    search_url = f"/libraries/{library_id}/search/"
+
+    # Unique per run, since the persistent cache outlives the test database's libraries
+    query_text = f"popular query {uuid.uuid4()}"
+    for k in (1, 2):
+        response = test_client.post(search_url, json={"query_text": query_text, "k": k})
+        assert response.status_code == 200
+        assert response.json()[0]["chunk"]["text"] == "c3"
+    assert calls == ["search_query"]
+
+    both = {"query_text": query_text, "query_embedding": [3.0, 1.0]}
+    assert test_client.post(search_url, json=both).status_code == 400
+    assert test_client.post(search_url, json={"k": 1}).status_code == 400
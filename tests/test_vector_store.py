@@ -0,0 +1,59 @@
+import numpy as np
+
+from app.repositories.vector_store import VectorStore, _stores, get_vector_store
+
+
+def test_vector_store_append_update_delete_across_segments(tmp_path):
+    store = VectorStore(str(tmp_path / "vectors_lib"), segment_capacity=4)
+    vectors = np.arange(30, dtype=np.float32).reshape(10, 3)
+    rows = store.append_many(list(vectors))
+
+    assert rows == list(range(10))
+    assert len(store.segments()) == 3
+    assert np.array_equal(store.read_all(), vectors)
+
+    store.update(5, [-1.0, -2.0, -3.0])
+    store.delete(2)
+    assert np.array_equal(store.take([5, 0, 9]), np.array([[-1, -2, -3], vectors[0], vectors[9]], dtype=np.float32))
+    assert store.tombstones().tolist() == [False, False, True] + [False] * 7
+
+    reopened = VectorStore(str(tmp_path / "vectors_lib"))
+    assert reopened.count == 10
+    assert reopened.segment_capacity == 4
+    assert np.array_equal(reopened.take([5]), [[-1, -2, -3]])
+    assert reopened.tombstones()[2]
+
+
+def test_vector_store_compaction_remaps_rows(tmp_path):
+    store = VectorStore(str(tmp_path / "vectors_lib"), segment_capacity=4)
+    vectors = np.arange(18, dtype=np.float32).reshape(6, 3)
+    store.append_many(list(vectors))
+    store.delete(1)
+    store.delete(4)
+
+    mapping = store.compact()
+
+    assert mapping.tolist() == [0, -1, 1, 2, -1, 3]
+    assert store.count == 4
+    assert np.array_equal(store.read_all(), vectors[[0, 2, 3, 5]])
+    assert not store.tombstones().any()
+    assert store.append([0.0, 0.0, 0.0]) == 4
+
+
+def test_legacy_npy_vectors_are_imported(tmp_path):
+    legacy = np.eye(3)
+    np.save(tmp_path / "vectors_legacy-lib.npy", legacy)
+
+    store = get_vector_store("legacy-lib", str(tmp_path))
+
+    assert store.count == 3
+    assert np.array_equal(store.read_all(), legacy.astype(np.float32))
+    assert not (tmp_path / "vectors_legacy-lib.npy").exists()
+    assert (tmp_path / "vectors_legacy-lib.npy.migrated").exists()
+
+    # A store emptied by compaction doesn't import the old vectors again on the next start
+    for row in range(3):
+        store.delete(row)
+    store.compact()
+    _stores.pop("legacy-lib")
+    assert get_vector_store("legacy-lib", str(tmp_path)).count == 0
@@ -4,19 +4,17 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.repositories.library_repository import LibraryRepository
-from app.repositories.document_repository import DocumentRepository
-from app.repositories.chunk_repository import ChunkRepository
-import numpy as np
+from app.repositories.library_repository import library_repository as library_repo
+from app.repositories.document_repository import document_repository as document_repo
+from app.repositories.chunk_repository import chunk_repository as chunk_repo
+from app.repositories.migrations import run_migrations
+from app.repositories.vector_store import get_vector_store
 
 def verify_data():
     """Verify that data was properly added to the database"""
     print("Verifying database content...")
     
-    # Initialize repositories
-    library_repo = LibraryRepository()
-    document_repo = DocumentRepository()
-    chunk_repo = ChunkRepository()
+    run_migrations()
     
     # 1. Check libraries
     libraries = library_repo.get_all_libraries()
@@ -47,19 +45,19 @@ def verify_data():
     data_dir = "data"
     if os.path.exists(data_dir):
         for file in os.listdir(data_dir):
-            if file.startswith("vectors_") and file.endswith(".npy"):
-                file_path = os.path.join(data_dir, file)
+            file_path = os.path.join(data_dir, file)
+            if file.startswith("vectors_") and os.path.isdir(file_path):
                 try:
-                    vectors = np.load(file_path, allow_pickle=True)
-                    print(f"  {file}: {len(vectors)} vectors")
-                except:
+                    store = get_vector_store(file[len("vectors_"):], data_dir)
+                    print(f"  {file}: {store.count} vectors ({int(store.tombstones().sum())} deleted)")
+                except Exception:
                     print(f"  {file}: Could not load")
     
     # 5. Check index files
     print("\nChecking index files...")
     if os.path.exists(data_dir):
         for file in os.listdir(data_dir):
-            if file.startswith("index_") and file.endswith(".pkl"):
+            if file.startswith("index_") and file.endswith((".idx", ".pkl")):
                 file_path = os.path.join(data_dir, file)
                 file_size = os.path.getsize(file_path)
                 print(f"  {file}: {file_size} bytes")